@@ -0,0 +1,142 @@
+import asyncio
+import random
+import time
+from collections import namedtuple
+
+
+# Vienos komandos rezultatas: ar pavyko, klaida (jei buvo) ir trukmė
+CommandResult = namedtuple(
+    "CommandResult", ["device", "attr", "value", "ok", "error", "elapsed"])
+
+
+class Transport:
+    # Perduoda komandą tikram įrenginiui (pvz., per tinklą)
+    async def send(self, device, attr, value):
+        raise NotImplementedError
+
+
+class SimulatedTransport(Transport):
+    # Testams: komanda "keliauja" latency (+- jitter) sekundžių, o failing
+    # sąraše esantys įrenginiai grąžina klaidą
+    def __init__(self, latency=0.01, jitter=0.0, failing=(), seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failing = set(failing)
+        self.sent = []
+        self._random = random.Random(seed)
+
+    async def send(self, device, attr, value):
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        await asyncio.sleep(max(delay, 0))
+        if device.get_name() in self.failing:
+            raise ConnectionError(f"{device.get_name()} neatsako")
+        self.sent.append((device.get_name(), attr, value))
+
+
+class AsyncDevice:
+    def __init__(self, controller, device):
+        self._controller = controller
+        self.device = device
+
+    def get_name(self):
+        return self.device.get_name()
+
+    def is_on(self):
+        return self.device.is_on()
+
+    async def set_param(self, attr, value):
+        return await self._controller.send(self.device, attr, value)
+
+    async def turn_on(self):
+        return await self.set_param("status", True)
+
+    async def turn_off(self):
+        return await self.set_param("status", False)
+
+
+class AsyncValdymas:
+    # Asinchroninis sluoksnis virš Valdymas: komanda pirma nusiunčiama per
+    # transportą, o pavykus pritaikoma atmintyje esančiam įrenginiui.
+    # Masinės operacijos siunčiamos lygiagrečiai, bet ne daugiau nei
+    # concurrency vienu metu, kiekvienai komandai skiriant timeout sekundžių
+    def __init__(self, valdymas, transport, concurrency=100, timeout=5.0):
+        self.valdymas = valdymas
+        self.transport = transport
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self):
+        # Semaforas susietas su įvykių ciklu, todėl kuriamas kiekvienam ciklui
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def device(self, name):
+        device = self.valdymas.get_device(name)
+        if device is None:
+            raise ValueError(f"Įrenginys nerastas: {name}")
+        return AsyncDevice(self, device)
+
+    async def send(self, device, attr, value):
+        # Nežinomas parametras - programos klaida, ne įrenginio
+        setter = type(device).setter(attr)
+        async with self._get_semaphore():
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    self.transport.send(device, attr, value), self.timeout)
+            except asyncio.TimeoutError:
+                return CommandResult(device, attr, value, False, "timeout",
+                                     time.perf_counter() - start)
+            except Exception as error:
+                return CommandResult(device, attr, value, False, str(error),
+                                     time.perf_counter() - start)
+            elapsed = time.perf_counter() - start
+        setter(device, value)
+        if device.get_param(attr) != value:
+            return CommandResult(device, attr, value, False, "atmesta", elapsed)
+        return CommandResult(device, attr, value, True, None, elapsed)
+
+    async def _dispatch(self, commands):
+        return await asyncio.gather(
+            *(self.send(device, attr, value) for device, attr, value in commands))
+
+    async def apply_changes(self, changes, where=None):
+        # Tas pats formatas kaip Valdymas.apply_changes; siunčiamos tik
+        # komandos įrenginiams, kurie dar nėra norimos būsenos
+        commands = []
+        for device_class, params in changes.items():
+            for device in self.valdymas.get_devices_by_type(device_class):
+                if where is not None and not where(device):
+                    continue
+                for attr, value in params.items():
+                    if device.get_param(attr) != value:
+                        commands.append((device, attr, value))
+        return await self._dispatch(commands)
+
+    async def turn_on_all(self):
+        return await self.apply_changes(
+            {device_class: {"status": True}
+             for device_class in self.valdymas.device_types()})
+
+    async def turn_off_all(self):
+        return await self.apply_changes(
+            {device_class: {"status": False}
+             for device_class in self.valdymas.device_types()})
+
+    async def apply_scene(self, scene):
+        _, plan = self.valdymas.scenes.plan(scene)
+        commands = [(device, attr, value)
+                    for device, actions in plan
+                    for _, slot, attr, value in actions
+                    if getattr(device, slot) != value]
+        return await self._dispatch(commands)
+
+    async def leavehome(self):
+        return await self.apply_scene("leavehome")
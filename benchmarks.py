@@ -0,0 +1,360 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from main import TV, Light, AirConditioner, Door, Camera, DeviceFactory
+
+
+SAMPLE_DEVICES = {
+    TV: lambda name: TV(name, 1, 20),
+    Light: lambda name: Light(name, 50),
+    AirConditioner: lambda name: AirConditioner(name, 22),
+    Door: lambda name: Door(name, False),
+    Camera: lambda name: Camera(name, "1080p"),
+}
+
+
+def _slot_names(device_class):
+    for cls in reversed(device_class.__mro__):
+        yield from getattr(cls, "__slots__", ())
+
+
+def _dict_device_class(device_class):
+    # Toks pat objektas kaip įrenginys be __slots__ (laukai laikomi __dict__).
+    # Kiekvienam tipui atskira klasė, kad veiktų bendrų raktų dict'ai
+    fields = tuple(_slot_names(device_class))
+
+    class DictDevice:
+        def __init__(self, device):
+            for field in fields:
+                setattr(self, field, getattr(device, field))
+
+    return DictDevice
+
+
+def _bytes_per_object(make, names):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [make(name) for name in names]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Sąrašo, kuriame laikomi objektai, dydžio nelaikome įrenginio dalimi
+    list_size = objects.__sizeof__()
+    return (after - before - list_size) / len(objects)
+
+
+def bench_memory(count=100_000):
+    names = [f"device-{i}" for i in range(count)]
+    results = {}
+    for device_class, make in SAMPLE_DEVICES.items():
+        template = make("template")
+        dict_class = _dict_device_class(device_class)
+        legacy = _bytes_per_object(lambda name: dict_class(template), names)
+        slotted = _bytes_per_object(make, names)
+        results[device_class.__name__] = {"dict": legacy, "slots": slotted}
+    return results
+
+
+def _run_python(code, cwd):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def bench_startup(repeat=10):
+    # "import main" trukmė atskiro proceso viduje, atėmus paties
+    # interpretatoriaus paleidimą. Vykdoma tuščiame kataloge, kad
+    # devices.json buvimas neturėtų įtakos
+    with tempfile.TemporaryDirectory() as cwd:
+        bare = [_run_python("pass", cwd) for _ in range(repeat)]
+        imports = [_run_python("import main", cwd) for _ in range(repeat)]
+    return {"import_ms": max(statistics.median(imports)
+                             - statistics.median(bare), 0) * 1000}
+
+
+def _thread_ops(valdymas, lights, seed, ops):
+    for i in range(ops):
+        light = lights[(seed * 31 + i * 7) % len(lights)]
+        if i % 5000 == 0:
+            valdymas.snapshot()
+        elif i % 2:
+            light.set_brightness(i % 100)
+        else:
+            light.set_power(not light.is_on())
+
+
+def bench_threads(count=10_000, ops=20_000, threads=(1, 2, 4, 8)):
+    # Bendras operacijų per sekundę skaičius, kai tiek pat darbo padalinama
+    # kelioms gijoms. Dėl GIL CPython'e tikrasis lygiagretumas nedidelis -
+    # matuojama, kiek kainuoja užraktai ir ar našumas nesugriūva
+    from threadsafe import ThreadSafeValdymas
+
+    results = {}
+    for thread_count in threads:
+        valdymas = ThreadSafeValdymas(DeviceFactory())
+        lights = [valdymas.create_device("Light", f"Šviesa {i}", brightness=0)
+                  for i in range(count)]
+        per_thread = ops // thread_count
+        workers = [threading.Thread(target=_thread_ops,
+                                    args=(valdymas, lights, seed, per_thread))
+                   for seed in range(thread_count)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        results[thread_count] = per_thread * thread_count / elapsed
+    return results
+
+
+def _client(address, names, seed, requests, batch, latencies):
+    import http.client
+    import json
+
+    # Viena išlaikoma jungtis visoms kliento užklausoms
+    conn = http.client.HTTPConnection(*address)
+    headers = {"Content-Type": "application/json"}
+    for i in range(requests):
+        commands = []
+        for j in range(batch):
+            name = names[(seed * 31 + (i * batch + j) * 7) % len(names)]
+            if j % 2:
+                commands.append({"op": "get", "name": name})
+            else:
+                commands.append({"op": "set", "name": name,
+                                 "params": {"brightness": (i + j) % 100}})
+        body = json.dumps(commands if batch > 1 else commands[0])
+        start = time.perf_counter()
+        conn.request("POST", "/rpc", body, headers)
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def bench_server(count=1000, clients=8, requests=500, batch=1):
+    # Apkrovos testas serveriui tame pačiame procese: clients gijų, kiekviena
+    # per savo keep-alive jungtį siunčia requests užklausų po batch komandų
+    from server import ValdymasServer
+    from threadsafe import ThreadSafeValdymas
+
+    valdymas = ThreadSafeValdymas(DeviceFactory())
+    names = [valdymas.create_device("Light", f"Šviesa {i}", brightness=0).get_name()
+             for i in range(count)]
+    latencies = []
+    with ValdymasServer(valdymas, port=0).start() as server:
+        workers = [threading.Thread(target=_client,
+                                    args=(server.address, names, seed, requests,
+                                          batch, latencies))
+                   for seed in range(clients)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        coalesced = server.writes.requests - server.writes.flushes
+    latencies.sort()
+    return {"requests_per_s": len(latencies) / elapsed,
+            "commands_per_s": len(latencies) * batch / elapsed,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+            "coalesced_writes": coalesced}
+
+
+DEVICE_SPECS = (
+    ("TV", {"channel": 1, "volume": 20}),
+    ("Light", {"brightness": 50}),
+    ("AirConditioner", {"temperature": 22}),
+    ("Door", {"locked": False}),
+    ("Camera", {"resolution": "1080p"}),
+)
+
+
+def _best_time(run, setup=None, repeat=3):
+    # Mažiausias laikas iš repeat bandymų; setup() paruošia būseną ir į
+    # matavimą neįskaičiuojamas. Kaip ir timeit, matuojama išjungus gc,
+    # kitaip rezultatai labai priklauso nuo to, kada jis pasileidžia
+    best = None
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _filled_valdymas(count):
+    from main import Valdymas
+
+    valdymas = Valdymas(DeviceFactory)
+    for i in range(count):
+        device_type, params = DEVICE_SPECS[i % len(DEVICE_SPECS)]
+        valdymas.create_device(device_type, f"device-{i}", **params)
+    return valdymas
+
+
+def _suite_cases(count, directory):
+    from main import Valdymas
+
+    def create_all(valdymas):
+        for i in range(count):
+            device_type, params = DEVICE_SPECS[i % len(DEVICE_SPECS)]
+            valdymas.create_device(device_type, f"device-{i}", **params)
+
+    def factory(_):
+        for i in range(count):
+            device_type, params = DEVICE_SPECS[i % len(DEVICE_SPECS)]
+            DeviceFactory.create_device(device_type, f"device-{i}", **params)
+
+    def delete_all(valdymas):
+        for device in valdymas.devices:
+            valdymas.delete_device(device)
+
+    def all_off():
+        valdymas = _filled_valdymas(count)
+        valdymas.turn_off_all()
+        return valdymas
+
+    def all_on():
+        valdymas = _filled_valdymas(count)
+        valdymas.turn_on_all()
+        return valdymas
+
+    def print_info(valdymas):
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            with contextlib.redirect_stdout(devnull):
+                valdymas.print_device_info()
+
+    filled = _filled_valdymas(count)
+    cases = {
+        "factory.create_device": (factory, None),
+        "valdymas.create_device": (create_all, lambda: Valdymas(DeviceFactory)),
+        "valdymas.delete_device": (delete_all, lambda: _filled_valdymas(count)),
+        "turn_on_all": (lambda valdymas: valdymas.turn_on_all(), all_off),
+        "leavehome": (lambda valdymas: valdymas.leavehome(), all_on),
+        # cold - pirmas atvaizdavimas (eilučių podėlis tuščias), cached -
+        # pakartotinis be pakeitimų
+        "print_device_info.cold": (print_info, lambda: _filled_valdymas(count)),
+        "print_device_info.cached": (print_info, lambda: filled),
+    }
+    for format in ("json", "binary"):
+        filename = os.path.join(directory, f"devices-{count}.{format}")
+        filled.save_devices_to_file(filename, format=format)
+        cases[f"save.{format}"] = (
+            lambda _, f=filename, fmt=format: filled.save_devices_to_file(f, format=fmt),
+            None)
+        cases[f"load.{format}"] = (
+            lambda valdymas, f=filename, fmt=format:
+                valdymas.load_devices_from_file(f, format=fmt),
+            lambda: Valdymas(DeviceFactory))
+    return cases
+
+
+def bench_suite(sizes=(1000, 100_000), repeat=5):
+    # Rezultatas: {"atvejis[dydis]": mikrosekundės vienam įrenginiui}, kad
+    # skirtingų dydžių matavimus būtų galima lyginti tarpusavyje
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            for name, (run, setup) in _suite_cases(count, directory).items():
+                # Didžiausi dydžiai matuojami vieną kartą, kitaip trunka per ilgai
+                seconds = _best_time(run, setup, repeat if count < 1_000_000 else 1)
+                results[f"{name}[{count}]"] = seconds / count * 1_000_000
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.5):
+    # Atvejai, kurie sulėtėjo daugiau nei tolerance dalimi:
+    # [(pavadinimas, bazinis, dabartinis)]
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is not None and value > base * (1 + tolerance):
+            regressions.append((name, base, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Įrenginių našumo matavimai")
+    parser.add_argument("benchmark", nargs="?", default="memory",
+                        choices=["memory", "startup", "threads", "server", "suite"])
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=None)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=1,
+                        help="komandų skaičius vienoje užklausoje")
+    parser.add_argument("--sizes", default="1000,100000",
+                        help="įrenginių skaičiai per kablelį, pvz. 1000,100000,1000000")
+    parser.add_argument("--output", help="rezultatus įrašyti į JSON failą")
+    parser.add_argument("--baseline", help="palyginti su baziniu JSON failu")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="leistinas sulėtėjimas (0.5 = 50%%)")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="klaida, jei 'import main' trunka ilgiau")
+    args = parser.parse_args()
+
+    if args.benchmark == "memory":
+        print(f"{'Tipas':<16}{'__dict__ B':>12}{'__slots__ B':>12}")
+        for type_name, result in bench_memory(args.count).items():
+            print(f"{type_name:<16}{result['dict']:>12.1f}"
+                  f"{result['slots']:>12.1f}")
+    elif args.benchmark == "startup":
+        import_ms = bench_startup(args.repeat or 10)["import_ms"]
+        print(f"import main: {import_ms:.1f} ms")
+        if args.max_import_ms is not None and import_ms > args.max_import_ms:
+            print(f"Viršyta riba {args.max_import_ms:.1f} ms")
+            sys.exit(1)
+    elif args.benchmark == "threads":
+        print(f"{'Gijos':<8}{'op/s':>12}")
+        for thread_count, rate in bench_threads(min(args.count, 10_000)).items():
+            print(f"{thread_count:<8}{rate:>12.0f}")
+    elif args.benchmark == "server":
+        result = bench_server(min(args.count, 10_000), args.clients,
+                              batch=args.batch)
+        print(f"užklausų/s: {result['requests_per_s']:.0f}, "
+              f"komandų/s: {result['commands_per_s']:.0f}")
+        print(f"p50: {result['p50_ms']:.2f} ms, p99: {result['p99_ms']:.2f} ms")
+        print(f"sujungta rašymų: {result['coalesced_writes']}")
+    elif args.benchmark == "suite":
+        sizes = [int(size) for size in args.sizes.split(",")]
+        results = bench_suite(sizes, args.repeat or 5)
+        baseline = {}
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        print(f"{'Atvejis':<36}{'µs/įr.':>10}{'bazinis':>10}")
+        for name, value in results.items():
+            base = baseline.get(name)
+            print(f"{name:<36}{value:>10.3f}"
+                  f"{'' if base is None else f'{base:.3f}':>10}")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"python": sys.version.split()[0], "sizes": sizes,
+                           "results": results}, f, indent=2)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for name, base, value in regressions:
+            print(f"Sulėtėjo {name}: {base:.3f} -> {value:.3f} µs")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import sys
+import threading
+from collections import namedtuple
+
+
+# kind - pakeisto lauko pavadinimas ("status", "brightness", ...) arba
+# sisteminis įvykis ("added", "deleted", ...); device gali būti None
+Event = namedtuple("Event", ["kind", "device", "old", "new"])
+
+
+def _name(event):
+    return event.device.get_name()
+
+
+MESSAGES = {
+    "status": lambda e: f"{_name(e)} {'įjungtas' if e.new else 'išjungtas'}.",
+    "channel": lambda e: f"{_name(e)} perjungtas į kanalą {e.new}.",
+    "volume": lambda e: f"{_name(e)} nustatytas garsas {e.new}.",
+    "brightness": lambda e: f"{_name(e)} nustatytas ryškumas: {e.new}%.",
+    "temperature": lambda e: f"{_name(e)} nustatyta temperatūra: {e.new}°C.",
+    "invalid_temperature": lambda e: "Tokia temperatūra negalima",
+    "renamed": lambda e: f"Pavadinimas {e.old} kartojasi, įrenginys pervadintas į {e.new}.",
+    "invalid_record": lambda e: f"Praleistas netinkamas įrašas: {e.new}",
+    "invalid_value": lambda e: f"{_name(e)} netinkama reikšmė: {e.new}",
+    "locked": lambda e: (f"{_name(e)} durys dabar yra "
+                         f"{'užrakintos' if e.new else 'atrakintos'}."),
+    "resolution": lambda e: f"{_name(e)} pakeista rezoliucija į {e.new}.",
+    "added": lambda e: f"{_name(e)} įrenginys pridėtas.",
+    "deleted": lambda e: f"{_name(e)} įrenginys ištrintas.",
+    "leavehome": lambda e: "Režimas 'Išėjau iš namų' aktyvuotas.",
+    "no_file": lambda e: "Nėra išsaugoto įrenginių failo.",
+    "job_failed": lambda e: f"Suplanuota užduotis nepavyko: {e.new}",
+    "rule_loop": lambda e: f"Taisyklė '{e.new}' praleista: aptiktas ciklas.",
+}
+
+
+def format_event(event):
+    formatter = MESSAGES.get(event.kind)
+    if formatter is None:
+        return f"{event.kind}: {event.new}"
+    return formatter(event)
+
+
+class NullSink:
+    def emit(self, event):
+        pass
+
+    def flush(self):
+        pass
+
+
+class ConsoleSink:
+    def __init__(self, stream=None):
+        self._stream = stream
+
+    def emit(self, event):
+        print(format_event(event), file=self._stream or sys.stdout)
+
+    def flush(self):
+        pass
+
+
+class BufferedSink:
+    def __init__(self, stream=None, batch_size=1000):
+        self._stream = stream
+        self._batch_size = batch_size
+        self._lines = []
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        line = format_event(event)
+        with self._lock:
+            self._lines.append(line)
+            if len(self._lines) < self._batch_size:
+                return
+            lines, self._lines = self._lines, []
+        self._write(lines)
+
+    def flush(self):
+        with self._lock:
+            lines, self._lines = self._lines, []
+        if lines:
+            self._write(lines)
+
+    def _write(self, lines):
+        stream = self._stream or sys.stdout
+        stream.write("\n".join(lines) + "\n")
+
+
+class CollectingSink:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        pass
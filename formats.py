@@ -0,0 +1,304 @@
+import hashlib
+import json
+import mmap
+import struct
+
+from persistence import iter_json_array
+from schema import layouts as schema_layouts
+
+
+class JsonFormat:
+    name = "json"
+
+    def dump(self, records, filename):
+        with open(filename, "w") as f:
+            json.dump(list(records), f, indent=4)
+
+    def load(self, filename):
+        with open(filename, "rb") as f:
+            for _, _, item in iter_json_array(f):
+                yield item
+
+
+MAGIC = b"VLDM"
+VERSION = 1
+# magic, versija, tipų sk., įrenginių sk., katalogo, eilučių ir indekso vietos
+HEADER = struct.Struct("<4sHHIQQQ")
+# tipo pavadinimas, laukų aprašas (abu eilučių lentelėje), įrašų sk., vieta
+DIR_ENTRY = struct.Struct("<IIIQ")
+# pavadinimo maiša, tipo numeris kataloge, įrašo numeris
+INDEX_ENTRY = struct.Struct("<QHI")
+U32 = struct.Struct("<I")
+U32_PAIR = struct.Struct("<II")
+
+
+def _name_hash(name):
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _record_struct(fields):
+    # Kiekvienas įrašas: eilės numeris, pavadinimas, būsena ir tipo laukai
+    codes = "".join("I" if code == "s" else code for _, code in fields)
+    return struct.Struct("<II?" + codes)
+
+
+def _encode_fields(fields):
+    return ",".join(f"{name}:{code}" for name, code in fields)
+
+
+def _decode_fields(text):
+    if not text:
+        return ()
+    return tuple(tuple(part.split(":")) for part in text.split(","))
+
+
+class _StringTable:
+    def __init__(self):
+        self._index = {}
+        self.strings = []
+
+    def add(self, text):
+        idx = self._index.get(text)
+        if idx is None:
+            idx = self._index[text] = len(self.strings)
+            self.strings.append(text)
+        return idx
+
+    def to_bytes(self):
+        blobs = [text.encode("utf-8") for text in self.strings]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return (U32.pack(len(blobs))
+                + struct.pack(f"<{len(offsets)}I", *offsets)
+                + b"".join(blobs))
+
+
+class _Section:
+    def __init__(self, slot, type_name, fields):
+        self.slot = slot
+        self.type_name = type_name
+        self.fields = fields
+        self.struct = _record_struct(fields)
+        self.data = bytearray()
+        self.count = 0
+
+
+class BinaryFormat:
+    # Fiksuoto ilgio įrašai, sugrupuoti pagal įrenginio tipą; pavadinimai ir
+    # kitos eilutės laikomos vienoje eilučių lentelėje. Failo gale yra pagal
+    # pavadinimo maišą surikiuotas indeksas, kurį naudoja MappedSnapshot
+    name = "binary"
+
+    # layouts - kiekvieno tipo įrašo laukai ir jų struct kodai; "s" reiškia
+    # eilutę, kuri laikoma eilučių lentelėje, o įraše saugomas tik jos
+    # numeris. Nenurodžius imami iš registruotų įrenginių schemų (schema.py)
+    def __init__(self, layouts=None):
+        self.layouts = layouts
+
+    def dump(self, records, filename):
+        strings = _StringTable()
+        sections = {}
+        index = []
+        seq = 0
+        layouts = schema_layouts() if self.layouts is None else self.layouts
+        for seq, record in enumerate(records, 1):
+            type_name = record["type"]
+            section = sections.get(type_name)
+            if section is None:
+                fields = layouts.get(type_name)
+                if fields is None:
+                    raise ValueError(f"Nežinomas įrenginio tipas: {type_name}")
+                section = sections[type_name] = _Section(
+                    len(sections), type_name, fields)
+            values = [seq - 1, strings.add(record["name"]),
+                      bool(record["status"])]
+            for field, code in section.fields:
+                value = record[field]
+                values.append(strings.add(value) if code == "s" else value)
+            section.data += section.struct.pack(*values)
+            index.append((_name_hash(record["name"]), section.slot,
+                          section.count))
+            section.count += 1
+
+        dir_offset = HEADER.size
+        offset = dir_offset + DIR_ENTRY.size * len(sections)
+        directory = bytearray()
+        for section in sections.values():
+            directory += DIR_ENTRY.pack(
+                strings.add(section.type_name),
+                strings.add(_encode_fields(section.fields)),
+                section.count, offset)
+            offset += len(section.data)
+        strings_offset = offset
+        string_table = strings.to_bytes()
+        index_offset = strings_offset + len(string_table)
+        index.sort()
+
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(sections), seq,
+                                dir_offset, strings_offset, index_offset))
+            f.write(directory)
+            for section in sections.values():
+                f.write(section.data)
+            f.write(string_table)
+            f.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in index))
+
+    def load(self, filename):
+        with MappedSnapshot(filename) as snapshot:
+            yield from snapshot
+
+
+class MappedSnapshot:
+    # Dvejetainis failas, atvertas per mmap: pavienio įrenginio būsena
+    # randama dvejetainės paieškos būdu, neskaitant viso failo
+    def __init__(self, filename):
+        self._file = open(filename, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, type_count, self._count, dir_offset,
+         strings_offset, self._index_offset) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Netinkamas įrenginių failo formatas")
+        string_count = U32.unpack_from(self._map, strings_offset)[0]
+        self._string_offsets = strings_offset + U32.size
+        self._blob_start = self._string_offsets + U32.size * (string_count + 1)
+        self._sections = []
+        for i in range(type_count):
+            type_idx, fields_idx, count, offset = DIR_ENTRY.unpack_from(
+                self._map, dir_offset + i * DIR_ENTRY.size)
+            fields = _decode_fields(self._string(fields_idx))
+            self._sections.append((self._string(type_idx), fields,
+                                   _record_struct(fields), count, offset))
+
+    def _string(self, idx):
+        start, end = U32_PAIR.unpack_from(
+            self._map, self._string_offsets + U32.size * idx)
+        return self._map[self._blob_start + start:
+                         self._blob_start + end].decode("utf-8")
+
+    def _values(self, slot, record_idx):
+        _, _, record_struct, _, offset = self._sections[slot]
+        return record_struct.unpack_from(
+            self._map, offset + record_idx * record_struct.size)
+
+    def _record(self, slot, values, string=None):
+        string = string or self._string
+        type_name, fields = self._sections[slot][:2]
+        record = {"type": type_name, "name": string(values[1]),
+                  "status": values[2]}
+        for (field, code), value in zip(fields, values[3:]):
+            record[field] = string(value) if code == "s" else value
+        return record
+
+    def _all_strings(self):
+        count = (self._blob_start - self._string_offsets) // U32.size - 1
+        offsets = struct.unpack_from(f"<{count + 1}I", self._map,
+                                     self._string_offsets)
+        blob = self._map[self._blob_start:self._blob_start + offsets[-1]]
+        return [blob[offsets[i]:offsets[i + 1]].decode("utf-8")
+                for i in range(count)]
+
+    def _find(self, name):
+        target = _name_hash(name)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry_hash = INDEX_ENTRY.unpack_from(
+                self._map, self._index_offset + mid * INDEX_ENTRY.size)[0]
+            if entry_hash < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self._count:
+            entry_hash, slot, record_idx = INDEX_ENTRY.unpack_from(
+                self._map, self._index_offset + lo * INDEX_ENTRY.size)
+            if entry_hash != target:
+                break
+            values = self._values(slot, record_idx)
+            if self._string(values[1]) == name:
+                return slot, values
+            lo += 1
+        return None
+
+    def get(self, name):
+        found = self._find(name)
+        return None if found is None else self._record(*found)
+
+    def status(self, name):
+        found = self._find(name)
+        return None if found is None else found[1][2]
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        # Įrašai grąžinami ta pačia tvarka, kokia buvo išsaugoti. Skaitant
+        # visą failą eilučių lentelė iškoduojama vieną kartą
+        string = self._all_strings().__getitem__
+        records = [None] * self._count
+        for slot, (_, _, record_struct, count, offset) in enumerate(
+                self._sections):
+            data = self._map[offset:offset + count * record_struct.size]
+            for values in record_struct.iter_unpack(data):
+                records[values[0]] = self._record(slot, values, string)
+        return iter(records)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+FORMATS = {
+    JsonFormat.name: JsonFormat(),
+    BinaryFormat.name: BinaryFormat(),
+}
+
+
+def get_format(name):
+    try:
+        return FORMATS[name]
+    except KeyError:
+        raise ValueError(f"Nežinomas failo formatas: {name}") from None
+
+
+def convert(source, target, source_format="json", target_format="binary"):
+    get_format(target_format).dump(get_format(source_format).load(source),
+                                   target)
+
+
+def json_to_binary(source, target):
+    convert(source, target, "json", "binary")
+
+
+def binary_to_json(source, target):
+    convert(source, target, "binary", "json")
+
+
+def main():
+    import argparse
+
+    import main  # noqa: F401 - užregistruoja įrenginių schemas
+
+    parser = argparse.ArgumentParser(description="Įrenginių failo konvertavimas")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("--from", dest="source_format", default="json",
+                        choices=sorted(FORMATS))
+    parser.add_argument("--to", dest="target_format", default="binary",
+                        choices=sorted(FORMATS))
+    args = parser.parse_args()
+    convert(args.source, args.target, args.source_format, args.target_format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import json
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# Segmento failas: antraštė, eilučių katalogas pagal seriją, tada laiko ir
+# reikšmių stulpeliai (float64). Eilutės surikiuotos pagal seriją, o serijos
+# viduje - pagal laiką, todėl vieno įrenginio užklausa skaito tik savo dalį
+SEGMENT_MAGIC = b"HSEG"
+SEGMENT_HEADER = struct.Struct("<4sHHIQdd")
+SERIES_ENTRY = struct.Struct("<IQQdd")
+DOWNSAMPLED = 1
+
+
+def _numeric(value):
+    # Istorijoje saugomos tik skaitinės reikšmės (bool -> 0/1)
+    if isinstance(value, (bool, int, float)):
+        return float(value)
+    return None
+
+
+class Segment:
+    def __init__(self, path, flags, rows, min_ts, max_ts, series, columns=None):
+        self.path = path
+        self.flags = flags
+        self.rows = rows
+        self.min_ts = min_ts
+        self.max_ts = max_ts
+        # serija -> (pradžia, kiekis, mažiausias laikas, didžiausias laikas)
+        self.series = series
+        # Atmintyje laikomas segmentas (kai saugykla be katalogo)
+        self._columns = columns
+
+    @property
+    def downsampled(self):
+        return bool(self.flags & DOWNSAMPLED)
+
+    @classmethod
+    def write(cls, path, by_series, flags=0):
+        # by_series: serija -> (laikai, reikšmės), abu array("d")
+        times, values = array("d"), array("d")
+        series = {}
+        for sid in sorted(by_series):
+            ts, vs = by_series[sid]
+            series[sid] = (len(times), len(ts), ts[0], ts[-1])
+            times.extend(ts)
+            values.extend(vs)
+        min_ts = min(entry[2] for entry in series.values())
+        max_ts = max(entry[3] for entry in series.values())
+        if path is None:
+            return cls(None, flags, len(times), min_ts, max_ts, series,
+                       (times, values))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, 1, flags, len(series),
+                                        len(times), min_ts, max_ts))
+            for sid, entry in series.items():
+                f.write(SERIES_ENTRY.pack(sid, *entry))
+            times.tofile(f)
+            values.tofile(f)
+        os.replace(tmp, path)
+        return cls(path, flags, len(times), min_ts, max_ts, series)
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "rb") as f:
+            magic, _, flags, count, rows, min_ts, max_ts = SEGMENT_HEADER.unpack(
+                f.read(SEGMENT_HEADER.size))
+            if magic != SEGMENT_MAGIC:
+                raise ValueError(f"Netinkamas istorijos segmentas: {path}")
+            series = {}
+            for _ in range(count):
+                sid, *entry = SERIES_ENTRY.unpack(f.read(SERIES_ENTRY.size))
+                series[sid] = tuple(entry)
+        return cls(path, flags, rows, min_ts, max_ts, series)
+
+    def _column_offset(self, column):
+        return (SEGMENT_HEADER.size + SERIES_ENTRY.size * len(self.series)
+                + column * self.rows * 8)
+
+    def _read(self, f, column, start, count):
+        if self._columns is not None:
+            return self._columns[column][start:start + count]
+        values = array("d")
+        f.seek(self._column_offset(column) + start * 8)
+        values.fromfile(f, count)
+        return values
+
+    def columns(self, sid, start=None, end=None):
+        entry = self.series.get(sid)
+        if entry is None:
+            return array("d"), array("d")
+        first, count, min_ts, max_ts = entry
+        if (start is not None and max_ts < start) or (end is not None and min_ts > end):
+            return array("d"), array("d")
+        f = open(self.path, "rb") if self._columns is None else None
+        try:
+            times = self._read(f, 0, first, count)
+            low = 0 if start is None else bisect_left(times, start)
+            high = count if end is None else bisect_right(times, end)
+            return times[low:high], self._read(f, 1, first + low, high - low)
+        finally:
+            if f is not None:
+                f.close()
+
+    def all_series(self):
+        return {sid: self.columns(sid) for sid in self.series}
+
+    def delete(self):
+        if self.path is not None:
+            os.remove(self.path)
+
+
+class HistoryStore:
+    # Tik papildoma būsenų istorija (laikas, įrenginys, parametras, reikšmė).
+    # Nauji įrašai kaupiami stulpeliuose atmintyje; pasiekus segment_size jie
+    # surikiuojami pagal seriją ir įrašomi į segmentą (directory nenurodžius -
+    # paliekami atmintyje). Po kiekvieno segmento:
+    # - senesni nei retention sekundžių segmentai ištrinami;
+    # - senesni nei downsample_after sumažinami iki paskutinės reikšmės
+    #   kiekviename resolution sekundžių intervale (būsena galioja iki kito
+    #   pakeitimo, todėl paskutinė reikšmė išlaiko laiptinę kreivę)
+    def __init__(self, directory=None, segment_size=65536, retention=None,
+                 downsample_after=None, resolution=60, clock=time.time):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.retention = retention
+        self.downsample_after = downsample_after
+        self.resolution = resolution
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._series = {}
+        self._series_keys = []
+        # Dar neįrašyti įrašai: laiko ir reikšmių stulpeliai bei kiekvienos
+        # serijos eilučių numeriai juose
+        self._times = array("d")
+        self._values = array("d")
+        self._head_rows = {}
+        self._segments = []
+        self._next_segment = 0
+        self._valdymas = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._open()
+
+    def _series_file(self):
+        return os.path.join(self.directory, "series.json")
+
+    def _open(self):
+        if os.path.exists(self._series_file()):
+            with open(self._series_file(), "r", encoding="utf-8") as f:
+                for name, attr in json.load(f):
+                    self._series[(name, attr)] = len(self._series_keys)
+                    self._series_keys.append((name, attr))
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.endswith(".hseg"))
+        for name in names:
+            self._segments.append(Segment.read(os.path.join(self.directory, name)))
+            self._next_segment = int(name[4:-5]) + 1
+
+    def attach(self, valdymas):
+        valdymas.subscribe(self._on_event)
+        self._valdymas = valdymas
+        return self
+
+    def close(self):
+        if self._valdymas is not None:
+            self._valdymas.unsubscribe(self._on_event)
+            self._valdymas = None
+        self.flush()
+
+    def _on_event(self, event):
+        if event.device is None or event.old == event.new:
+            return
+        self.append(event.device.get_name(), event.kind, event.new)
+
+    def append(self, name, attr, value, timestamp=None):
+        value = _numeric(value)
+        if value is None:
+            return
+        with self._lock:
+            key = (name, attr)
+            sid = self._series.get(key)
+            if sid is None:
+                sid = self._series[key] = len(self._series_keys)
+                self._series_keys.append(key)
+            rows = self._head_rows.get(sid)
+            if rows is None:
+                rows = self._head_rows[sid] = array("I")
+            rows.append(len(self._times))
+            self._times.append(self.clock() if timestamp is None else timestamp)
+            self._values.append(value)
+            if len(self._times) >= self.segment_size:
+                self._seal()
+
+    def flush(self):
+        # Neužpildyti įrašai įrašomi kaip segmentas (pvz., prieš uždarant)
+        with self._lock:
+            if self._times:
+                self._seal()
+
+    def _segment_path(self):
+        if self.directory is None:
+            return None
+        path = os.path.join(self.directory, f"seg-{self._next_segment:08d}.hseg")
+        self._next_segment += 1
+        return path
+
+    def _seal(self):
+        by_series = {sid: self._head_columns(rows)
+                     for sid, rows in self._head_rows.items()}
+        for ts, vs in by_series.values():
+            # Laikrodis gali būti nemonotoniškas; rikiuojama tik jei reikia
+            if any(ts[i] > ts[i + 1] for i in range(len(ts) - 1)):
+                pairs = sorted(zip(ts, vs), key=lambda pair: pair[0])
+                ts[:] = array("d", (pair[0] for pair in pairs))
+                vs[:] = array("d", (pair[1] for pair in pairs))
+        if self.directory is not None:
+            tmp = self._series_file() + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._series_keys, f, ensure_ascii=False)
+            os.replace(tmp, self._series_file())
+        self._segments.append(Segment.write(self._segment_path(), by_series))
+        self._times, self._values = array("d"), array("d")
+        self._head_rows = {}
+        self._apply_policies()
+
+    def _head_columns(self, rows):
+        times, values = self._times, self._values
+        return (array("d", (times[row] for row in rows)),
+                array("d", (values[row] for row in rows)))
+
+    def _downsample(self, segment):
+        by_series = {}
+        resolution = self.resolution
+        for sid, (ts, vs) in segment.all_series().items():
+            times, values = array("d"), array("d")
+            for t, v in zip(ts, vs):
+                bucket = t - t % resolution
+                if times and times[-1] == bucket:
+                    values[-1] = v
+                else:
+                    times.append(bucket)
+                    values.append(v)
+            by_series[sid] = (times, values)
+        return Segment.write(self._segment_path(), by_series, DOWNSAMPLED)
+
+    def _apply_policies(self, now=None):
+        now = self.clock() if now is None else now
+        kept = []
+        for segment in self._segments:
+            if self.retention is not None and segment.max_ts < now - self.retention:
+                segment.delete()
+                continue
+            if (self.downsample_after is not None and not segment.downsampled
+                    and segment.max_ts < now - self.downsample_after):
+                downsampled = self._downsample(segment)
+                segment.delete()
+                segment = downsampled
+            kept.append(segment)
+        kept.sort(key=lambda segment: segment.min_ts)
+        self._segments = kept
+
+    def compact(self, now=None):
+        with self._lock:
+            self._apply_policies(now)
+
+    def query(self, name, attr, start=None, end=None):
+        # [(laikas, reikšmė)] laiko tvarka, start <= laikas <= end
+        with self._lock:
+            sid = self._series.get((name, attr))
+            if sid is None:
+                return []
+            segments = list(self._segments)
+            head = [(t, v) for t, v in zip(*self._head_columns(
+                        self._head_rows.get(sid, ())))
+                    if (start is None or t >= start) and (end is None or t <= end)]
+        result = []
+        for segment in segments:
+            ts, vs = segment.columns(sid, start, end)
+            result.extend(zip(ts, vs))
+        result.extend(head)
+        if any(result[i][0] > result[i + 1][0] for i in range(len(result) - 1)):
+            result.sort(key=lambda pair: pair[0])
+        return result
+
+    def attributes(self, name):
+        return [attr for device, attr in self._series_keys if device == name]
+
+    def __len__(self):
+        return sum(segment.rows for segment in self._segments) + len(self._times)
+
+    @property
+    def segments(self):
+        return list(self._segments)
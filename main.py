@@ -1,25 +1,92 @@
 from abc import ABC, abstractmethod
-import json
+from collections import deque, namedtuple
+from contextlib import contextmanager, nullcontext
+
+from events import ConsoleSink, Event
+from query import INDEXED_PARAMS, NameIndex, ValueIndex
+from scenes import SceneEngine
+from schema import SCHEMAS, DeviceSchema, Field, layouts, load_schemas
 
 
 class Device(ABC):
+    # __slots__ vietoj __dict__, kad dideli įrenginių kiekiai užimtų mažiau atminties
+    __slots__ = ("_name", "_status", "_owner", "_version")
+    # schema.DeviceSchema; nustatoma registruojant tipą DeviceFactory
+    _schema = None
+
     def __init__(self, name):
         self._name = name
         self._status = False
+        self._owner = None
+        # Didėja kaskart pasikeitus būsenai; priklausant Valdymas tai yra
+        # paskutinio pakeitimo versija (žr. Valdymas.changes_since)
+        self._version = 0
 
     def get_name(self):
         return self._name
 
+    def get_version(self):
+        return self._version
+
     def is_on(self):
         return self._status
 
     def turn_on(self):
-        self._status = True
-        print(f"{self._name} įjungtas.")
+        self._set("status", True)
 
     def turn_off(self):
-        self._status = False
-        print(f"{self._name} išjungtas.")
+        self._set("status", False)
+
+    def set_power(self, on):
+        if on:
+            self.turn_on()
+        else:
+            self.turn_off()
+
+    # Parametro pavadinimas -> metodas, kuriuo jis keičiamas
+    _setters = {"status": "set_power"}
+
+    @classmethod
+    def setter(cls, attr):
+        try:
+            return getattr(cls, cls._setters[attr])
+        except KeyError:
+            raise ValueError(
+                f"{cls.__name__} neturi parametro: {attr}") from None
+
+    def get_param(self, attr):
+        return getattr(self, "_" + attr)
+
+    def set_param(self, attr, value):
+        self.setter(attr)(self, value)
+
+    def _set(self, attr, value):
+        # Visi būsenos pakeitimai eina per čia, kad Valdymas atnaujintų
+        # indeksus ir praneštų apie įvykį
+        if self._owner is not None:
+            self._owner._change(self, attr, value)
+            return
+        slot = "_" + attr
+        old = getattr(self, slot)
+        setattr(self, slot, value)
+        if old != value:
+            self._version += 1
+
+    def restore(self, attr, value):
+        # Išsaugotos reikšmės atkūrimas (pvz., iš žurnalo) be tikrinimo
+        self._set(attr, value)
+
+    def _set_valid(self, attr, value, kind="invalid_value"):
+        # Reikšmė tikrinama schemos patikra (tipas, ribos); netinkama
+        # nekeičiama, tik pranešama
+        if self._schema is None or self._schema.valid(attr, value):
+            self._set(attr, value)
+        else:
+            self._report(kind, value)
+
+    def _report(self, kind, value):
+        if self._owner is not None:
+            self._owner._emit(kind, self, None, value)
 
     @abstractmethod
     def device_info(self):
@@ -27,6 +94,10 @@ class Device(ABC):
 
 
 class TV(Device):
+    __slots__ = ("_channel", "_volume")
+    _setters = {**Device._setters, "channel": "set_channel",
+                "volume": "set_volume"}
+
     def __init__(self, name, channel, volume):
         super().__init__(name)
         self._channel = channel
@@ -39,12 +110,10 @@ class TV(Device):
         return self._volume
 
     def set_channel(self, channel):
-        self._channel = channel
-        print(f"{self._name} perjungtas į kanalą {self._channel}.")
+        self._set_valid("channel", channel)
 
     def set_volume(self, volume):
-        self._volume = volume
-        print(f"{self._name} nustatytas garsas {self._volume}.")
+        self._set_valid("volume", volume)
 
     def device_info(self):
         return (f"{self._name} - Būsena: {'ON' if self._status else 'OFF'}, "
@@ -52,6 +121,9 @@ class TV(Device):
 
 
 class Light(Device):
+    __slots__ = ("_brightness",)
+    _setters = {**Device._setters, "brightness": "set_brightness"}
+
     def __init__(self, name, brightness):
         super().__init__(name)
         self._brightness = brightness
@@ -60,8 +132,7 @@ class Light(Device):
         return self._brightness
 
     def set_brightness(self, brightness):
-        self._brightness = brightness
-        print(f"{self._name} nustatytas ryškumas: {self._brightness}%.")
+        self._set_valid("brightness", brightness)
 
     def device_info(self):
         return (f"{self._name} - Būsena: {'ON' if self._status else 'OFF'}, "
@@ -69,6 +140,9 @@ class Light(Device):
 
 
 class AirConditioner(Device):
+    __slots__ = ("_temperature",)
+    _setters = {**Device._setters, "temperature": "set_temperature"}
+
     def __init__(self, name, temperature):
         super().__init__(name)
         self._temperature = temperature
@@ -77,11 +151,8 @@ class AirConditioner(Device):
         return self._temperature
 
     def set_temperature(self, temperature):
-        if temperature < -5 or temperature > 30:
-            print("Tokia temperatūra negalima")
-        else:
-            self._temperature = temperature
-            print(f"{self._name} nustatyta temperatūra: {self._temperature}°C.")
+        # Leidžiamos ribos (-5..30) aprašytos schemoje
+        self._set_valid("temperature", temperature, "invalid_temperature")
 
     def device_info(self):
         return (f"{self._name} - Būsena: {'ON' if self._status else 'OFF'}, "
@@ -89,6 +160,9 @@ class AirConditioner(Device):
 
 
 class Door(Device):
+    __slots__ = ("_locked",)
+    _setters = {**Device._setters, "locked": "set_status"}
+
     def __init__(self, name, locked=False):
         super().__init__(name)
         self._locked = locked
@@ -97,15 +171,16 @@ class Door(Device):
         return "Užrakinta" if self._locked else "Atrakinta"
 
     def set_status(self, status):
-        self._locked = status
-        print(f"{self._name} durys dabar yra "
-              f"{'užrakintos' if self._locked else 'atrakintos'}.")
+        self._set_valid("locked", status)
 
     def device_info(self):
         return f"{self._name} - Būsena: {self.get_status()}"
 
 
 class Camera(Device):
+    __slots__ = ("_resolution",)
+    _setters = {**Device._setters, "resolution": "set_resolution"}
+
     def __init__(self, name, resolution):
         super().__init__(name)
         self._resolution = resolution
@@ -114,8 +189,7 @@ class Camera(Device):
         return self._resolution
 
     def set_resolution(self, resolution):
-        self._resolution = resolution
-        print(f"{self._name} pakeista rezoliucija į {self._resolution}.")
+        self._set_valid("resolution", resolution)
 
     def device_info(self):
         return (f"{self._name} - Būsena: {'ON' if self._status else 'OFF'}, "
@@ -124,117 +198,541 @@ class Camera(Device):
 
 class DeviceFactory:
     _device_registry = {}
+    # Tipai su schema kuriami ir (de)serializuojami sugeneruotomis funkcijomis
+    _schemas = SCHEMAS
 
     @staticmethod
     def register_device(device_type, device_class):
+        # Tipas be schemos: kuriamas per klasės __init__, be patikrų
         DeviceFactory._device_registry[device_type] = device_class
+        DeviceFactory._schemas.pop(device_type, None)
+
+    @staticmethod
+    def register_schema(schema):
+        schema.bind(Device)
+        DeviceFactory._device_registry[schema.type_name] = schema.device_class
+        DeviceFactory._schemas[schema.type_name] = schema
+        return schema.device_class
+
+    @staticmethod
+    def load_plugin(spec):
+        # JSON failas su schemų sąrašu arba Python modulis su sąrašu SCHEMAS
+        if spec.endswith(".json"):
+            schemas = load_schemas(spec)
+        else:
+            import importlib
+
+            schemas = getattr(importlib.import_module(spec), "SCHEMAS", ())
+        return [DeviceFactory.register_schema(schema) for schema in schemas]
+
+    @staticmethod
+    def schema(device_type):
+        return DeviceFactory._schemas.get(device_type)
+
+    @staticmethod
+    def device_types():
+        return list(DeviceFactory._device_registry)
+
+    @staticmethod
+    def layouts():
+        return layouts()
 
     @staticmethod
     def create_device(device_type, name, *args, **kwargs):
+        schema = DeviceFactory._schemas.get(device_type)
+        if schema is not None:
+            return schema.create(name, *args, **kwargs)
         device_class = DeviceFactory._device_registry.get(device_type)
         if device_class:
             return device_class(name, *args, **kwargs)
         raise ValueError(f"Nerastas įrenginys: {device_type}")
 
+    @staticmethod
+    def decode(record):
+        # devices.json įrašas -> įrenginys (be Valdymas įvykių)
+        schema = DeviceFactory._schemas.get(record["type"])
+        if schema is not None:
+            return schema.decode(record)
+        params = {k: v for k, v in record.items()
+                  if k not in ("type", "name", "status")}
+        device = DeviceFactory.create_device(record["type"], record["name"], **params)
+        device._status = bool(record["status"])
+        return device
+
+
+# Pakeitimai nuo tam tikros versijos: pakeisti/pridėti įrenginiai ir
+# ištrintų įrenginių pavadinimai
+Changes = namedtuple("Changes", ["version", "changed", "deleted"])
+
+# Suderinta visų įrenginių būsena (įrašai kaip devices.json) ties versija
+Snapshot = namedtuple("Snapshot", ["version", "records"])
+
+# Masinės operacijos rezultatas: kiek įrenginių atitiko, kiek pakeitimų
+# atlikta ir kiek pakeista pagal tipą
+BulkResult = namedtuple("BulkResult", ["matched", "changed", "by_type"])
+
 
 class Valdymas:
-    def __init__(self, device_factory):
+    # Struktūrų apsauga; paprastame Valdymas nieko nedaro, o
+    # threadsafe.ThreadSafeValdymas čia įstato tikrą užraktą
+    _lock = nullcontext()
+
+    def __init__(self, device_factory, sink=None):
         self._device_factory = device_factory
-        self.devices = []
+        # Įvykių gavėjas (events.py); be jo masinės operacijos nieko nespausdina
+        self.sink = sink
+        # Būsenos pakeitimų prenumeratoriai (pvz., persistence.Journal)
+        self._listeners = []
+        # Masinės operacijos gylis ir funkcijos, kviečiamos jai pasibaigus
+        # (pvz., Journal daro vieną fsync visai operacijai)
+        self._bulk_depth = 0
+        self._bulk_hooks = []
+        self.scenes = SceneEngine(self)
+        self._status_report = None
+        # Įrenginiai laikomi dict'e (išlaiko eiliškumą), o indeksai leidžia
+        # rasti juos pagal pavadinimą, tipą ir būseną per O(1)
+        self._devices = {}
+        self._by_name = {}
+        self._by_type = {}
+        self._by_status = {True: {}, False: {}}
+        # Antriniai indeksai užklausoms (query.py): surikiuoti pavadinimai ir
+        # skaitinių parametrų reikšmės
+        self._names = NameIndex(self._lock)
+        self._values = {attr: ValueIndex() for attr in INDEXED_PARAMS}
+        self._indexed_params = {}
+        # Didėja kiekvieną kartą pridėjus ar ištrynus įrenginį
+        self._generation = 0
+        # Didėja po kiekvieno pakeitimo. _changed ir _deleted laikomi
+        # versijų tvarka, todėl changes_since() kainuoja O(pakeitimų).
+        # _deleted - (versija, pavadinimas), ne patys įrenginiai; iki
+        # _forgotten jie išmesti (forget_changes)
+        self._version = 0
+        self._changed = {}
+        self._deleted = deque()
+        self._forgotten = 0
+
+    @property
+    def devices(self):
+        with self._lock:
+            return list(self._devices)
+
+    def __len__(self):
+        return len(self._devices)
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def device_types(self):
+        with self._lock:
+            return list(self._by_type)
+
+    @property
+    def version(self):
+        return self._version
+
+    def _mark_changed(self, device):
+        self._version += 1
+        device._version = self._version
+        self._changed.pop(device, None)
+        self._changed[device] = self._version
+
+    def changes_since(self, version):
+        with self._lock:
+            return self._changes_since(version)
+
+    def _changes_since(self, version):
+        changed = []
+        for device, device_version in reversed(self._changed.items()):
+            if device_version <= version:
+                break
+            changed.append(device)
+        deleted = []
+        for device_version, name in reversed(self._deleted):
+            if device_version <= version:
+                break
+            deleted.append(name)
+        changed.reverse()
+        deleted.reverse()
+        return Changes(self._version, changed, deleted)
+
+    def forget_changes(self, version):
+        # Ištrintų įrenginių istorija iki version nebereikalinga (pvz., jau
+        # įrašyta persistence.Journal). Seniausi įrašai yra priekyje
+        with self._lock:
+            deleted = self._deleted
+            while deleted and deleted[0][0] <= version:
+                deleted.popleft()
+            self._forgotten = max(self._forgotten, version)
+
+    @property
+    def forgotten_version(self):
+        # changes_since() mažesnei versijai ištrintųjų sąrašas nepilnas
+        return self._forgotten
+
+    def get_device(self, name):
+        devices = self._by_name.get(name)
+        if devices:
+            return next(iter(devices))
+        return None
+
+    def get_devices_by_type(self, device_class):
+        with self._lock:
+            return list(self._by_type.get(device_class, ()))
+
+    def get_devices_by_status(self, status):
+        with self._lock:
+            return list(self._by_status[bool(status)])
+
+    def query(self, query):
+        # query - query.py sąlyga, pvz. TypeIs(Light) & Between("brightness", 50)
+        return query.run(self)
+
+    # Indeksai, kuriuos naudoja query.py; jų keisti negalima
+    def type_index(self, device_class):
+        return self._by_type.get(device_class, {})
+
+    def status_index(self, status):
+        return self._by_status[bool(status)]
+
+    def value_index(self, attr):
+        return self._values.get(attr)
+
+    def name_index(self):
+        return self._names, self._by_name
+
+    def _params_to_index(self, device_class):
+        # Schemos tipams indeksuojami tik skaitiniai laukai: įskiepio laukas
+        # tokiu pat pavadinimu (pvz. "volume") gali būti ir eilutė
+        params = self._indexed_params.get(device_class)
+        if params is None:
+            schema = device_class._schema
+            params = self._indexed_params[device_class] = tuple(
+                attr for attr in device_class._setters if attr in self._values
+                and (schema is None or schema.field(attr) is None
+                     or schema.field(attr).numeric))
+        return params
+
+    def _add(self, device):
+        self._devices[device] = None
+        name = device.get_name()
+        same_name = self._by_name.get(name)
+        if same_name is None:
+            same_name = self._by_name[name] = {}
+            self._names.add(name)
+        same_name[device] = None
+        self._by_type.setdefault(type(device), {})[device] = None
+        self._by_status[bool(device.is_on())][device] = None
+        for attr in self._params_to_index(type(device)):
+            self._values[attr].add(getattr(device, "_" + attr), device)
+        device._owner = self
+        self._generation += 1
+        self._mark_changed(device)
+
+    def _remove(self, device):
+        del self._devices[device]
+        same_name = self._by_name[device.get_name()]
+        del same_name[device]
+        if not same_name:
+            del self._by_name[device.get_name()]
+            self._names.remove(device.get_name())
+        same_type = self._by_type[type(device)]
+        del same_type[device]
+        if not same_type:
+            del self._by_type[type(device)]
+        del self._by_status[bool(device.is_on())][device]
+        for attr in self._params_to_index(type(device)):
+            self._values[attr].remove(getattr(device, "_" + attr), device)
+        device._owner = None
+        self._generation += 1
+        self._version += 1
+        self._changed.pop(device, None)
+        self._deleted.append((self._version, device.get_name()))
+
+    def _change(self, device, attr, value):
+        slot = "_" + attr
+        old = getattr(device, slot)
+        setattr(device, slot, value)
+        if old != value:
+            self._update_indexes(device, attr, old, value)
+        self._publish(attr, device, old, value)
+
+    def _update_indexes(self, device, attr, old, new):
+        if attr == "status":
+            del self._by_status[bool(old)][device]
+            self._by_status[bool(new)][device] = None
+        elif attr in self._params_to_index(type(device)):
+            self._values[attr].remove(old, device)
+            self._values[attr].add(new, device)
+        self._mark_changed(device)
+
+    # Sąrašas keičiamas kopijuojant, kad _publish galėtų jį skaityti be užrakto
+    def subscribe(self, listener):
+        self._listeners = self._listeners + [listener]
+
+    def unsubscribe(self, listener):
+        listeners = list(self._listeners)
+        listeners.remove(listener)
+        self._listeners = listeners
+
+    def add_bulk_hook(self, hook):
+        self._bulk_hooks = self._bulk_hooks + [hook]
+
+    def remove_bulk_hook(self, hook):
+        hooks = list(self._bulk_hooks)
+        hooks.remove(hook)
+        self._bulk_hooks = hooks
+
+    @property
+    def in_bulk(self):
+        return self._bulk_depth > 0
+
+    @contextmanager
+    def bulk(self):
+        with self._lock:
+            self._bulk_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._bulk_depth -= 1
+                done = not self._bulk_depth
+            if done:
+                for hook in self._bulk_hooks:
+                    hook()
+
+    def _publish(self, kind, device, old=None, new=None):
+        # Būsenos pakeitimas: gauna ir sink, ir prenumeratoriai
+        if self.sink is None and not self._listeners:
+            return
+        event = Event(kind, device, old, new)
+        if self.sink is not None:
+            self.sink.emit(event)
+        for listener in self._listeners:
+            listener(event)
+
+    def _emit(self, kind, device=None, old=None, new=None):
+        # Tik pranešimas vartotojui, būsena nesikeičia
+        if self.sink is not None:
+            self.sink.emit(Event(kind, device, old, new))
 
     def create_device(self, device_type, name, *args, **kwargs):
+        # Pavadinimas turi būti unikalus: pagal jį įrenginys randamas žurnale
+        # (persistence.Journal), serveryje ir skaidiniuose
         device = self._device_factory.create_device(
             device_type, name, *args, **kwargs)
-        self.devices.append(device)
-        print(f"{device.get_name()} įrenginys pridėtas.")
+        with self._lock:
+            if name in self._by_name:
+                raise ValueError(f"Įrenginys {name} jau yra")
+            self._add(device)
+        self._publish("added", device)
         return device
 
     def delete_device(self, device):
-        if device in self.devices:
-            self.devices.remove(device)
-            print(f"{device.get_name()} įrenginys ištrintas.")
-
+        with self._lock:
+            if device not in self._devices:
+                return
+            self._remove(device)
+        self._publish("deleted", device)
+
+    def apply_changes(self, changes, where=None):
+        # changes: {įrenginio klasė: {parametras: reikšmė}}. Įrenginiai
+        # apdorojami grupėmis pagal tipą, metodas parenkamas vieną kartą
+        # grupei, o jau norimos būsenos įrenginiai praleidžiami
+        with self.bulk():
+            return self._apply_changes(changes, where)
+
+    def _apply_changes(self, changes, where):
+        matched = changed = 0
+        by_type = {}
+        for device_class, params in changes.items():
+            with self._lock:
+                devices = dict(self._by_type.get(device_class, ()))
+            if not devices:
+                continue
+            if where is not None:
+                devices = {device: None for device in devices if where(device)}
+            matched += len(devices)
+            type_changed = 0
+            for attr, value in params.items():
+                setter = device_class.setter(attr)
+                slot = "_" + attr
+                if attr == "status":
+                    # Pagal būsenos indeksą imami tik keistini įrenginiai
+                    with self._lock:
+                        pending = self._by_status[not value]
+                        smaller, larger = sorted((devices, pending), key=len)
+                        targets = [device for device in smaller
+                                   if device in larger]
+                else:
+                    targets = [device for device in devices
+                               if getattr(device, slot) != value]
+                for device in targets:
+                    setter(device, value)
+                    if getattr(device, slot) == value:
+                        type_changed += 1
+            if type_changed:
+                by_type[device_class.__name__] = type_changed
+            changed += type_changed
+        return BulkResult(matched, changed, by_type)
+
+    # device_types() kopijuoja tipus po užraktu: kita gija gali juos keisti
     def turn_on_all(self):
-        for device in self.devices:
-            device.turn_on()
+        return self.apply_changes(
+            {device_class: {"status": True} for device_class in self.device_types()})
 
     def turn_off_all(self):
-        for device in self.devices:
-            device.turn_off()
+        return self.apply_changes(
+            {device_class: {"status": False} for device_class in self.device_types()})
 
-    def print_device_info(self):
-        for device in self.devices:
-            print(device.device_info())
+    def status_report(self):
+        # reports.StatusReport su eilučių podėliu; sukuriamas tik prireikus
+        if self._status_report is None:
+            from reports import StatusReport
 
-    def leavehome(self):
-        for device in self.devices:
-            if isinstance(device, (Light, TV, AirConditioner)):
-                device.turn_off()
-            elif isinstance(device, Door):
-                device.set_status(True)
-            elif isinstance(device, Camera):
-                device.turn_on()
-        print("Režimas 'Išėjau iš namų' aktyvuotas.")
-
-    def save_devices_to_file(self, filename="devices.json"):
-        data = []
-        for device in self.devices:
-            device_data = {
-                "type": type(device).__name__,
-                "name": device.get_name(),
-                "status": device.is_on()
-            }
-            if isinstance(device, TV):
-                device_data.update({
-                    "channel": device.get_channel(),
-                    "volume": device.get_volume()
-                })
-            elif isinstance(device, Light):
-                device_data["brightness"] = device.get_brightness()
-            elif isinstance(device, AirConditioner):
-                device_data["temperature"] = device.get_temperature()
-            elif isinstance(device, Door):
-                device_data["locked"] = device._locked
-            elif isinstance(device, Camera):
-                device_data["resolution"] = device.get_resolution()
-            data.append(device_data)
-
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=4)
-
-    def load_devices_from_file(self, filename="devices.json"):
-        try:
-            with open(filename, "r") as f:
-                data = json.load(f)
+            self._status_report = StatusReport(self)
+        return self._status_report
 
-            for item in data:
-                params = {k: v for k, v in item.items()
-                         if k not in ("type", "name", "status")}
-                device = self._device_factory.create_device(
-                    item["type"], item["name"], **params)
+    def print_device_info(self):
+        self.status_report().print()
 
-                if item["status"]:
-                    device.turn_on()
-                else:
-                    device.turn_off()
+    def apply_scene(self, scene):
+        # scene - scenos pavadinimas arba scenes.Scene objektas
+        with self.bulk():
+            return self.scenes.apply(scene)
 
-                self.devices.append(device)
+    def leavehome(self):
+        report = self.apply_scene("leavehome")
+        self._emit("leavehome")
+        return report
+
+    @staticmethod
+    def device_record(device):
+        schema = type(device)._schema
+        if schema is not None and schema.device_class is type(device):
+            return schema.encode(device)
+        # Klasė be schemos: parametrai pagal _setters
+        device_data = {
+            "type": type(device).__name__,
+            "name": device.get_name(),
+            "status": device.is_on()
+        }
+        for attr in type(device)._setters:
+            if attr != "status":
+                device_data[attr] = device.get_param(attr)
+        return device_data
+
+    def snapshot(self):
+        with self._lock:
+            return Snapshot(self._version,
+                            [self.device_record(device) for device in self._devices])
+
+    def save_devices_to_file(self, filename="devices.json", format="json"):
+        # Failų moduliai importuojami tik prireikus, kad "import main" būtų pigus
+        from formats import get_format
+
+        get_format(format).dump(self.snapshot().records, filename)
+
+    def restore_device(self, item):
+        # Atkuriama būsena nėra vartotojo veiksmas, todėl be įvykių. Seni
+        # failai gali turėti vienodus pavadinimus; pasikartojantis
+        # pervadinamas ("Lempa (2)"), kad žurnalas rastų būtent jį. Failas
+        # įkeliamas ta pačia tvarka, todėl ir po lūžio gaunami tie patys vardai
+        device = self._device_factory.decode(item)
+        original = device._name
+        with self._lock:
+            if original in self._by_name:
+                number = 2
+                while f"{original} ({number})" in self._by_name:
+                    number += 1
+                device._name = f"{original} ({number})"
+            self._add(device)
+        if device._name != original:
+            self._emit("renamed", device, original, device._name)
+        return device
 
+    def load_devices_from_file(self, filename="devices.json", lazy=False,
+                               format="json"):
+        # JSON failas skaitomas po vieną įrašą, todėl nereikia viso failo
+        # atmintyje. lazy=True grąžina LazyDeviceFile: įrenginys sukuriamas ir
+        # pridedamas į Valdymas tik pirmą kartą jį pasiekus
+        from formats import get_format
+        from persistence import LazyDeviceFile
 
+        try:
+            if lazy:
+                if format != "json":
+                    raise ValueError("Tingus įkėlimas galimas tik JSON failams")
+                return LazyDeviceFile(filename, self.restore_device)
+            for item in get_format(format).load(filename):
+                try:
+                    self.restore_device(item)
+                except ValueError as error:
+                    # Sugadintas įrašas praleidžiamas, kiti įkeliami
+                    self._emit("invalid_record", None, None, str(error))
         except FileNotFoundError:
-            print("Nėra išsaugoto įrenginių failo.")
+            self._emit("no_file")
 
 
 # Registruojame įrenginius
-DeviceFactory.register_device("TV", TV)
-DeviceFactory.register_device("Light", Light)
-DeviceFactory.register_device("AirConditioner", AirConditioner)
-DeviceFactory.register_device("Door", Door)
-DeviceFactory.register_device("Camera", Camera)
-
-valdymas = Valdymas(DeviceFactory)
-valdymas.load_devices_from_file()
-
+DeviceFactory.register_schema(DeviceSchema("TV", (
+    Field("channel", "int", prompt="Įveskite kanalą: ", label="kanalas"),
+    Field("volume", "int", prompt="Įveskite garsumą: ", label="garso lygis"),
+), device_class=TV, label="TV"))
+DeviceFactory.register_schema(DeviceSchema("Light", (
+    Field("brightness", "int", prompt="Įveskite ryškumą: ", label="ryškumas"),
+), device_class=Light, label="Šviesa"))
+DeviceFactory.register_schema(DeviceSchema("AirConditioner", (
+    Field("temperature", "int", min=-5, max=30, prompt="Įveskite temperatūrą: ",
+          label="temperatūra"),
+), device_class=AirConditioner, label="Kondicionierius"))
+DeviceFactory.register_schema(DeviceSchema("Door", (
+    Field("locked", "bool", default=False,
+          prompt="Ar durys užrakintos? (taip/ne): ", label="užraktas",
+          values={"užrakinti": True, "atrakinti": False}),
+), device_class=Door, label="Durys"))
+DeviceFactory.register_schema(DeviceSchema("Camera", (
+    Field("resolution", "str", prompt="Įveskite rezoliuciją: ", label="rezoliucija"),
+), device_class=Camera, label="Kamera"))
+
+
+
+class App:
+    # Programos objektas: įrenginiai įkeliami ne importuojant modulį, o tik
+    # iškvietus start() arba pirmą kartą pasiekus app.valdymas
+    def __init__(self, snapshot="devices.json", journal="devices.journal",
+                 sink=None, compact_every=1000, valdymas_class=None):
+        self.snapshot = snapshot
+        self.journal_file = journal
+        self.sink = sink
+        self.compact_every = compact_every
+        # Pvz. threadsafe.ThreadSafeValdymas, kai įrenginius valdo kelios gijos
+        self.valdymas_class = valdymas_class or Valdymas
+        self.journal = None
+        self._valdymas = None
+
+    @property
+    def valdymas(self):
+        if self._valdymas is None:
+            self.start()
+        return self._valdymas
+
+    def start(self):
+        from persistence import Journal
+
+        valdymas = self.valdymas_class(DeviceFactory, sink=self.sink)
+        # Pakeitimai iškart rašomi į žurnalą, kad lūžus programai jie neprarastų
+        self.journal = Journal(self.journal_file, snapshot=self.snapshot,
+                               compact_every=self.compact_every)
+        self.journal.open(valdymas)
+        self._valdymas = valdymas
+        return valdymas
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.compact()
+            self.journal.close()
+            self.journal = None
 
 
 def show_menu():
@@ -252,47 +750,47 @@ def show_menu():
     return input("Pasirinkite veiksmą: ")
 
 
-def handle_tv_parameters(tv):
-    param = input("Keisti (kanalas/garso lygis): ").lower()
-    if param == "kanalas":
-        tv.set_channel(int(input("Naujas kanalas: ")))
-    elif param == "garso lygis":
-        tv.set_volume(int(input("Naujas garsumas: ")))
-    else:
-        print("Neteisinga komanda.")
+def choose(items, prompt):
+    # Numeris skaičiuojamas nuo 1; netinkamas - IndexError arba ValueError
+    number = int(input(prompt))
+    if not 1 <= number <= len(items):
+        raise IndexError(number)
+    return items[number - 1]
 
 
-def handle_ac_parameters(ac):
-    param = input("Keisti (temperatūra): ").lower()
-    if param == "temperatūra":
-        ac.set_temperature(int(input("Nauja temperatūra: ")))
-    else:
-        print("Neteisinga komanda.")
+def menu_schemas(editable=False):
+    # Meniu rodomi tipai (su schema); editable - tik turintys laukų
+    schemas = [DeviceFactory.schema(device_type)
+               for device_type in DeviceFactory.device_types()]
+    return [schema for schema in schemas
+            if schema is not None and (schema.fields or not editable)]
 
 
-def handle_door_parameters(door):
-    param = input("Keisti (užrakinti/atrakinti): ").lower()
-    if param == "užrakinti":
-        door.set_status(True)
-    elif param == "atrakinti":
-        door.set_status(False)
-    else:
-        print("Neteisinga komanda.")
-
-
-def handle_light_parameters(light):
-    param = input("Keisti (ryškumas): ").lower()
-    if param == "ryškumas":
-        light.set_brightness(int(input("Naujas ryškumas (0-100): ")))
-    else:
+def edit_device_parameters(device, schema):
+    # Meniu rodomi lietuviški laukų pavadinimai arba reikšmių žodžiai
+    # (pvz. "užrakinti/atrakinti"), ne atributų vardai
+    options = {}
+    for field in schema.fields:
+        if field.values:
+            for word, value in field.values.items():
+                options[word] = (field, value)
+        else:
+            options[field.label] = (field, None)
+    choice = next(iter(options))
+    if len(options) > 1:
+        choice = input(f"Keisti ({'/'.join(options)}): ").strip().lower()
+    if choice not in options:
         print("Neteisinga komanda.")
+        return
+    field, value = options[choice]
+    if not field.values:
+        value = field.parse(input(field.prompt))
+    device.set_param(field.name, value)
 
-def handle_camera_parameters(camera):
-    camera.set_resolution(input("Nauja rezoliucija: "))
 
-
-
-def main():
+def main(app=None):
+    app = app or App(sink=ConsoleSink())
+    valdymas = app.valdymas
     while True:
         choice = show_menu()
 
@@ -303,33 +801,28 @@ def main():
         elif choice == "3":
             valdymas.print_device_info()
         elif choice == "4":
-            device_type = input("Įveskite įrenginio tipą (TV, Light, "
-                              "AirConditioner, Door, Camera): ")
+            schemas = menu_schemas()
+            device_type = input("Įveskite įrenginio tipą ("
+                                + ", ".join(schema.label for schema in schemas)
+                                + "): ").strip().lower()
             name = input("Įveskite įrenginio pavadinimą: ")
 
-            if device_type == "TV":
-                channel = int(input("Įveskite kanalą: "))
-                volume = int(input("Įveskite garsumą: "))
-                valdymas.create_device(device_type, name, channel=channel, volume=volume)
-            elif device_type == "Light":
-                brightness = int(input("Įveskite ryškumą: "))
-                valdymas.create_device(device_type, name,
-                                      brightness=brightness)
-            elif device_type == "AirConditioner":
-                temperature = int(input("Įveskite temperatūrą: "))
-                valdymas.create_device(device_type, name,
-                                      temperature=temperature)
-            elif device_type == "Door":
-                status = input("Ar durys užrakintos? (True/False): ").lower() == 'true'
-                valdymas.create_device(device_type, name, locked=status)
-
-            elif device_type == "Camera":
-                resolution = input("Įveskite rezoliuciją: ")
-                valdymas.create_device(device_type, name, resolution=resolution)
+            # Klausimai ir reikšmių tipai imami iš įrenginio schemos
+            schema = next((schema for schema in schemas
+                           if device_type in (schema.label.lower(),
+                                              schema.type_name.lower())), None)
+            if schema is not None:
+                try:
+                    params = {field.name: field.parse(input(field.prompt))
+                              for field in schema.fields}
+                    valdymas.create_device(schema.type_name, name, **params)
+                except ValueError as error:
+                    print(error)
+            else:
+                print("Nežinomas įrenginio tipas.")
         elif choice == "5":
             device_name = input("Įveskite įrenginio pavadinimą: ")
-            device = next((d for d in valdymas.devices
-                          if d.get_name() == device_name), None)
+            device = valdymas.get_device(device_name)
             if device:
                 valdymas.delete_device(device)
             else:
@@ -337,83 +830,35 @@ def main():
         elif choice == "6":
             valdymas.leavehome()
         elif choice == "7":
+            schemas = menu_schemas(editable=True)
             print("Pasirinkite įrenginio tipą:")
-            print("1. TV\n2. Kondicionierius\n3. Durys\n4. Šviesa\n5. Kamera")
-            device_choice = input("Įveskite numerį: ")
-
-            if device_choice == "1":
-                tvs = [d for d in valdymas.devices if isinstance(d, TV)]
-                if tvs:
-                    for i, tv in enumerate(tvs, 1):
-                        print(f"{i}. {tv.get_name()}")
-                    try:
-                        selected = int(input("Pasirinkite TV: ")) - 1
-                        handle_tv_parameters(tvs[selected])
-                    except (ValueError, IndexError):
-                        print("Netinkamas pasirinkimas.")
-                else:
-                    print("Nėra TV įrenginių.")
-            if device_choice == "2":
-                acs = [d for d in valdymas.devices if isinstance(d, AirConditioner)]
-                if acs:
-                    for i, ac in enumerate(acs, 1):
-                        print(f"{i}. {ac.get_name()}")
-                    try:
-                        selected = int(input("Pasirinkite kondicionierių: ")) - 1
-                        handle_ac_parameters(acs[selected])
-                    except (ValueError, IndexError):
-                        print("Netinkamas pasirinkimas.")
-                else:
-                    print("Nėra kondicionieriaus įrenginių.")
-            if device_choice == "3":
-                doors = [d for d in valdymas.devices if isinstance(d, Door)]
-                if doors:
-                    for i, door in enumerate(doors, 1):
-                        print(f"{i}. {door.get_name()}")
-                    try:
-                        selected = int(input("Pasirinkite durį: ")) - 1
-                        handle_door_parameters(doors[selected])
-                    except (ValueError, IndexError):
-                        print("Netinkamas pasirinkimas.")
-                else:
-                    print("Nėra tokių durų.")
-            if device_choice == "4":
-                lights = [d for d in valdymas.devices if isinstance(d, Light)]
-                if lights:
-                    for i, light in enumerate(lights, 1):
-                        print(f"{i}. {light.get_name()}")
-                    try:
-                        selected = int(input("Pasirinkite šviesą: ")) - 1
-                        handle_light_parameters(lights[selected])
-                    except (ValueError, IndexError):
-                        print("Netinkamas pasirinkimas.")
-                else:
-                    print("Nėra šviesos įrenginių.")
-
-            if device_choice == "5":
-                cameras = [d for d in valdymas.devices if isinstance(d, Camera)]
-                if cameras:
-                    for i, camera in enumerate(cameras, 1):
-                        print(f"{i}. {camera.get_name()}")
-                    try:
-                        selected = int(input("Pasirinkite kamerą: ")) - 1
-                        handle_camera_parameters(cameras[selected])
-                    except (ValueError, IndexError):
-                        print("Netinkamas pasirinkimas.")
+            for i, schema in enumerate(schemas, 1):
+                print(f"{i}. {schema.label}")
+            try:
+                schema = choose(schemas, "Įveskite numerį: ")
+                devices = valdymas.get_devices_by_type(schema.device_class)
+                if devices:
+                    for i, device in enumerate(devices, 1):
+                        print(f"{i}. {device.get_name()}")
+                    edit_device_parameters(choose(devices, "Pasirinkite įrenginį: "),
+                                           schema)
                 else:
-                    print("Nėra kamerų.")
+                    print(f"Nėra įrenginių: {schema.label}.")
+            except (ValueError, IndexError):
+                print("Netinkamas pasirinkimas.")
 
         elif choice == "8":
-            for i, d in enumerate(valdymas.devices, 1):
+            devices = valdymas.devices
+            for i, d in enumerate(devices, 1):
                 print(f"{i}. {d.get_name()}  ({'ON' if d.is_on() else 'OFF'})")
             try:
                 pasirinktas = int(input("Pasirinkite įrenginį: ")) - 1
-                if 0 <= pasirinktas < len(valdymas.devices):
+                if 0 <= pasirinktas < len(devices):
                     veiksmas = input("Įjungti ar išjungti? ").lower()
                     if veiksmas == "įjungti":
-                        valdymas.devices[pasirinktas].turn_on()
+                        devices[pasirinktas].turn_on()
                     elif veiksmas == "išjungti":
-                        valdymas.devices[pasirinktas].turn_off()
+                        devices[pasirinktas].turn_off()
                     else:
                         print("Neteisingas veiksmas.")
                 else:
@@ -422,7 +867,7 @@ def main():
                 print("Klaida pasirenkant įrenginį.")
 
         elif choice == "9":
-            valdymas.save_devices_to_file()
+            app.close()
             print("Programa baigta. Įrenginiai išsaugoti.")
             break
         else:
@@ -0,0 +1,313 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import wraps
+
+
+# Histogramų ribos sekundėmis: 1 µs, 2 µs, 4 µs, ... ~8 s
+BUCKETS = tuple(1e-6 * 2 ** i for i in range(24))
+
+BULK_OPERATIONS = ("apply_changes", "turn_on_all", "turn_off_all", "apply_scene",
+                   "leavehome", "print_device_info")
+VALDYMAS_OPERATIONS = BULK_OPERATIONS + (
+    "create_device", "delete_device", "save_devices_to_file",
+    "load_devices_from_file", "snapshot")
+JOURNAL_OPERATIONS = ("checkpoint", "sync", "compact", "replay")
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # Apytikslė reikšmė - viršutinė kibiro, kuriame yra q dalis, riba
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for i, count in enumerate(self.counts):
+            total += count
+            if total >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" \
+        if labels else ""
+
+
+class Metrics:
+    # Skaitikliai ir delsos histogramos. Valdymas pats nieko nematuoja:
+    # attach() apgaubia konkretaus objekto metodus, todėl neprijungus
+    # metrikų papildomų sąnaudų nėra visai
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        # Funkcijos, kurios detach() metu atstato pakeistus objektus
+        self._restore = []
+        self.profiler = None
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, seconds):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def counter(self, name, labels=()):
+        return self._counters.get((name, labels), 0)
+
+    def histogram(self, name, labels=()):
+        return self._histograms.get((name, labels))
+
+    def _timed(self, function, name, labels, profile=False):
+        clock = self.clock
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            profiler = self.profiler if profile else None
+            if profiler is not None:
+                profiler.start()
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.observe(name, labels, clock() - start)
+                if profiler is not None:
+                    profiler.stop()
+        return timed
+
+    def instrument(self, obj, methods, name, profile=()):
+        # Objekto metodai pakeičiami matuojančiais (tik šiam objektui)
+        for method in methods:
+            setattr(obj, method, self._timed(
+                getattr(obj, method), name, (("op", method),),
+                profile=method in profile))
+            self._restore.append(lambda method=method: delattr(obj, method))
+
+    def attach(self, valdymas, journal=None):
+        self.instrument(valdymas, VALDYMAS_OPERATIONS, "valdymas_operation_seconds",
+                        profile=BULK_OPERATIONS)
+        if journal is not None:
+            self.instrument(journal, JOURNAL_OPERATIONS, "journal_operation_seconds")
+
+        # Kiekvienas būsenos pakeitimas eina per _change, įskaitant sink
+        # (pvz., print) ir prenumeratorių darbą
+        change = valdymas._change
+
+        def timed_change(device, attr, value):
+            start = self.clock()
+            change(device, attr, value)
+            labels = (("type", type(device).__name__), ("attr", attr))
+            self.observe("device_change_seconds", labels, self.clock() - start)
+            self.inc("device_changes_total", labels)
+        valdymas._change = timed_change
+        self._restore.append(lambda: delattr(valdymas, "_change"))
+
+        factory = valdymas._device_factory
+        valdymas._device_factory = _TimedFactory(factory, self)
+        self._restore.append(lambda: setattr(valdymas, "_device_factory", factory))
+
+        sink = valdymas.sink
+        if sink is not None:
+            valdymas.sink = _TimedSink(sink, self)
+            self._restore.append(lambda: setattr(valdymas, "sink", sink))
+        return self
+
+    def detach(self):
+        for restore in reversed(self._restore):
+            restore()
+        self._restore = []
+
+    def rows(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        return counters, histograms
+
+    def render_text(self):
+        elapsed = max(self.clock() - self.started, 1e-9)
+        counters, histograms = self.rows()
+        lines = []
+        for (name, labels), value in counters:
+            lines.append(f"{name}{_labels(labels)} {value} "
+                         f"({value / elapsed:.1f}/s)")
+        for (name, labels), histogram in histograms:
+            lines.append(
+                f"{name}{_labels(labels)} n={histogram.count} "
+                f"({histogram.count / elapsed:.1f}/s) "
+                f"vid.={histogram.sum / histogram.count * 1e6:.1f} µs "
+                f"p50≤{histogram.quantile(0.5) * 1e6:.0f} µs "
+                f"p99≤{histogram.quantile(0.99) * 1e6:.0f} µs")
+        return "\n".join(lines) + "\n"
+
+    def render_prometheus(self):
+        counters, histograms = self.rows()
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            total = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                total += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} "
+                             f"{total}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} "
+                         f"{histogram.count}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename, format="prometheus"):
+        text = self.render_prometheus() if format == "prometheus" else self.render_text()
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def serve(self, host="127.0.0.1", port=9100):
+        # Prometheus formatas adresu http://host:port/metrics, atskiroje gijoje
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd
+
+
+class _TimedFactory:
+    def __init__(self, factory, metrics):
+        self.factory = factory
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        # decode, schema ir kt. perduodami be matavimo
+        return getattr(self.factory, name)
+
+    def create_device(self, device_type, name, *args, **kwargs):
+        start = self._metrics.clock()
+        try:
+            return self.factory.create_device(device_type, name, *args, **kwargs)
+        finally:
+            self._metrics.observe("factory_create_seconds", (("type", device_type),),
+                                  self._metrics.clock() - start)
+
+
+class _TimedSink:
+    def __init__(self, sink, metrics):
+        self.sink = sink
+        self._metrics = metrics
+
+    def emit(self, event):
+        start = self._metrics.clock()
+        self.sink.emit(event)
+        self._metrics.observe("sink_emit_seconds", (("kind", event.kind),),
+                              self._metrics.clock() - start)
+
+    def flush(self):
+        self.sink.flush()
+
+
+class SamplingProfiler:
+    # Kas interval sekundžių užfiksuoja gijos, kuri vykdo masinę operaciją,
+    # steką. Įjungiamas priskyrus metrics.profiler = SamplingProfiler()
+    def __init__(self, interval=0.001, depth=30):
+        self.interval = interval
+        self.depth = depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._targets[thread_id] = self._targets.get(thread_id, 0) + 1
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._targets[thread_id] -= 1
+            if not self._targets[thread_id]:
+                del self._targets[thread_id]
+            if self._targets or self._thread is None:
+                return
+            thread, self._thread = self._thread, None
+            self._stopped.set()
+        thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                targets = list(self._targets)
+            frames = sys._current_frames()
+            for thread_id in targets:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._sample(frame)
+
+    def _sample(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.depth:
+            code = frame.f_code
+            stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def top(self, limit=10):
+        # Funkcijos, kurios dažniausiai buvo steko viršuje
+        functions = Counter()
+        for stack, count in self.stacks.items():
+            functions[stack.rsplit(";", 1)[-1]] += count
+        return functions.most_common(limit)
+
+    def collapsed(self):
+        # "a;b;c skaičius" eilutės, tinkamos flamegraph įrankiams
+        return "\n".join(f"{stack} {count}" for stack, count in
+                         self.stacks.most_common()) + "\n"
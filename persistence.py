@@ -0,0 +1,302 @@
+import codecs
+import json
+import os
+import re
+import threading
+import time
+from array import array
+
+
+CHUNK_SIZE = 1 << 16
+
+_SKIP = re.compile(r"[\s,]*")
+
+
+def _utf8_length(text):
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def iter_json_array(fileobj, chunk_size=CHUNK_SIZE):
+    # Skaito JSON masyvą po vieną elementą ir grąžina (baito poslinkis,
+    # ilgis baitais, reikšmė). Failas turi būti atidarytas dvejetainiu režimu
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    raw_decode = json.JSONDecoder().raw_decode
+    buf = ""
+    pos = 0
+    offset = 0
+    eof = False
+    started = False
+
+    while True:
+        end = _SKIP.match(buf, pos).end()
+        offset += _utf8_length(buf[pos:end])
+        pos = end
+
+        need_more = pos == len(buf)
+        if not need_more:
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("Failas nėra JSON masyvas")
+                started = True
+                pos += 1
+                offset += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                value, end = raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                need_more = True
+            else:
+                # Skaičius buferio gale gali būti nukirstas
+                if end == len(buf) and not eof:
+                    need_more = True
+                else:
+                    length = _utf8_length(buf[pos:end])
+                    yield offset, length, value
+                    offset += length
+                    pos = end
+
+        if need_more:
+            if eof:
+                raise ValueError("Netikėta failo pabaiga")
+            data = fileobj.read(chunk_size)
+            if data:
+                buf = buf[pos:] + decoder.decode(data)
+            else:
+                eof = True
+                buf = buf[pos:] + decoder.decode(b"", final=True)
+            pos = 0
+
+
+class LazyDeviceFile:
+    # Įsimena tik kiekvieno įrašo vietą faile; įrenginys sukuriamas
+    # (make_device) tik pirmą kartą jį pasiekus
+    def __init__(self, filename, make_device, chunk_size=CHUNK_SIZE):
+        self._file = open(filename, "rb")
+        self._make_device = make_device
+        self._offsets = array("q")
+        self._lengths = array("q")
+        self._devices = {}
+        for offset, length, _ in iter_json_array(self._file, chunk_size):
+            self._offsets.append(offset)
+            self._lengths.append(length)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        device = self._devices.get(index)
+        if device is None:
+            self._file.seek(self._offsets[index])
+            record = json.loads(self._file.read(self._lengths[index]))
+            device = self._make_device(record)
+            self._devices[index] = device
+        return device
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def materialized(self):
+        return len(self._devices)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Journal:
+    # Rašymo į priekį žurnalas: kiekvienas pakeitimas prirašomas kaip viena
+    # JSON eilutė, o compact() įrašo visą būseną į momentinę kopiją
+    # (devices.json) ir išvalo žurnalą. Operacijos idempotentinės, todėl
+    # lūžis tarp kopijos pakeitimo ir žurnalo išvalymo nieko nesugadina.
+    #
+    # sync_every - po kiek įrašų daryti fsync (0 - tik close()/sync() metu)
+    # sync_interval - ne rečiau kaip kas tiek sekundžių (None - nenaudoti)
+    # compact_every - po kiek įrašų automatiškai daryti compact(); riba ne
+    # mažesnė už įrenginių skaičių, kad suspaudimas (O(įrenginių)) kainuotų
+    # O(1) vienam įrašui. Masinės operacijos metu (Valdymas.bulk()) fsync ir
+    # suspaudimas atidedami iki jos pabaigos
+    # format - momentinės kopijos formatas (žr. formats.py)
+    # per_change - rašyti kiekvieną pakeitimą iškart; jei False, pakeitimai
+    # rašomi tik kviečiant checkpoint() (tik pasikeitę įrenginiai)
+    def __init__(self, filename, snapshot="devices.json", sync_every=1,
+                 sync_interval=None, compact_every=None, format="json",
+                 per_change=True, clock=time.monotonic):
+        self.filename = filename
+        self.snapshot = snapshot
+        self.format = format
+        self.per_change = per_change
+        self._checkpoint_version = 0
+        # Pakeitimai gali ateiti iš kelių gijų (threadsafe.ThreadSafeValdymas)
+        self._lock = threading.RLock()
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self._clock = clock
+        self._valdymas = None
+        self._file = None
+        self._pending = 0
+        self._records = 0
+        self._last_sync = clock()
+
+    def open(self, valdymas):
+        # Įkelia momentinę kopiją, pritaiko žurnalą ir pradeda registruoti
+        # naujus pakeitimus
+        valdymas.load_devices_from_file(self.snapshot, format=self.format)
+        sink, valdymas.sink = valdymas.sink, None
+        try:
+            self._records = self.replay(valdymas)
+        finally:
+            valdymas.sink = sink
+        self._valdymas = valdymas
+        self._checkpoint_version = valdymas.version
+        self._file = open(self.filename, "a", encoding="utf-8")
+        if self.per_change:
+            valdymas.subscribe(self._on_event)
+            valdymas.add_bulk_hook(self._bulk_done)
+        return self
+
+    def replay(self, valdymas):
+        count = 0
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Paskutinė eilutė galėjo likti neužbaigta po lūžio
+                        break
+                    self._apply(valdymas, record)
+                    count += 1
+        except FileNotFoundError:
+            pass
+        return count
+
+    @staticmethod
+    def _apply(valdymas, record):
+        op = record.pop("op")
+        device = valdymas.get_device(record["name"])
+        if op == "set":
+            if device is not None:
+                device.restore(record["attr"], record["value"])
+        elif op == "del":
+            if device is not None:
+                valdymas.delete_device(device)
+        elif op == "add":
+            # Pavadinimai unikalūs (Valdymas.create_device), todėl toks pat
+            # pavadinimas ir tipas reiškia tą patį įrenginį, pvz. checkpoint()
+            # įrašą jau momentinėje kopijoje esančiam įrenginiui
+            if device is not None and type(device).__name__ == record["type"]:
+                # Jau esantis įrenginys atnaujinamas vietoje
+                for attr, value in record.items():
+                    if attr not in ("type", "name"):
+                        device.restore(attr, value)
+                return
+            if device is not None:
+                valdymas.delete_device(device)
+            valdymas.restore_device(record)
+
+    def _add_record(self, device):
+        record = {"op": "add"}
+        record.update(self._valdymas.device_record(device))
+        return record
+
+    def _on_event(self, event):
+        name = event.device.get_name()
+        if event.kind == "added":
+            record = self._add_record(event.device)
+        elif event.kind == "deleted":
+            record = {"op": "del", "name": name}
+        else:
+            record = {"op": "set", "name": name, "attr": event.kind,
+                      "value": event.new}
+        self._write(record)
+
+    def _write(self, record):
+        with self._lock:
+            self._write_locked(record)
+
+    def _write_locked(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False,
+                                    separators=(",", ":")) + "\n")
+        self._pending += 1
+        self._records += 1
+        if not self._valdymas.in_bulk:
+            self._flush_due()
+
+    def _flush_due(self):
+        if self.compact_every and self._records >= max(self.compact_every,
+                                                       len(self._valdymas)):
+            self.compact()
+        elif ((self.sync_every and self._pending >= self.sync_every)
+              or (self.sync_interval is not None
+                  and self._clock() - self._last_sync >= self.sync_interval)):
+            self.sync()
+
+    def _bulk_done(self):
+        with self._lock:
+            if self._file is not None and self._pending:
+                self._flush_due()
+
+    def checkpoint(self):
+        # Įrašo tik nuo praeito karto pasikeitusius įrenginius: O(pakeitimų),
+        # ne O(visų įrenginių)
+        with self._lock:
+            changes = self._valdymas.changes_since(self._checkpoint_version)
+            for name in changes.deleted:
+                self._write_locked({"op": "del", "name": name})
+            for device in changes.changed:
+                self._write_locked(self._add_record(device))
+            self._checkpoint_version = changes.version
+            self.sync()
+        # Ištrinti įrenginiai jau žurnale; jų istorija nebereikalinga
+        self._valdymas.forget_changes(changes.version)
+        return len(changes.changed) + len(changes.deleted)
+
+    def sync(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+            self._last_sync = self._clock()
+
+    def compact(self):
+        # formats.py pats importuoja šį modulį, todėl importuojama čia
+        from formats import get_format
+
+        with self._lock:
+            tmp = self.snapshot + ".tmp"
+            snapshot = self._valdymas.snapshot()
+            get_format(self.format).dump(snapshot.records, tmp)
+            with open(tmp, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot)
+            self._file.close()
+            self._file = open(self.filename, "w", encoding="utf-8")
+            self.sync()
+            self._records = 0
+            self._checkpoint_version = snapshot.version
+            self._valdymas.forget_changes(snapshot.version)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self.sync()
+                self._file.close()
+                self._file = None
+                if self.per_change:
+                    self._valdymas.unsubscribe(self._on_event)
+                    self._valdymas.remove_bulk_hook(self._bulk_done)
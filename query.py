@@ -0,0 +1,236 @@
+from bisect import bisect_left, bisect_right, insort
+from contextlib import nullcontext
+
+
+# Skaitiniai parametrai, kuriems Valdymas palaiko surikiuotus indeksus
+INDEXED_PARAMS = ("brightness", "temperature", "volume", "channel")
+
+
+class ValueIndex:
+    # Reikšmė -> įrenginiai, plius surikiuotas skirtingų reikšmių sąrašas,
+    # todėl intervalo paieška kainuoja O(log n + rezultatų)
+    def __init__(self):
+        self._buckets = {}
+        self._keys = []
+
+    def add(self, value, device):
+        bucket = self._buckets.get(value)
+        if bucket is None:
+            bucket = self._buckets[value] = {}
+            insort(self._keys, value)
+        bucket[device] = None
+
+    def remove(self, value, device):
+        bucket = self._buckets[value]
+        del bucket[device]
+        if not bucket:
+            del self._buckets[value]
+            del self._keys[bisect_left(self._keys, value)]
+
+    def _key_range(self, low, high):
+        start = 0 if low is None else bisect_left(self._keys, low)
+        end = len(self._keys) if high is None else bisect_right(self._keys, high)
+        return self._keys[start:end]
+
+    def count(self, low=None, high=None):
+        return sum(len(self._buckets.get(key, ())) for key in self._key_range(low, high))
+
+    def range(self, low=None, high=None):
+        for key in self._key_range(low, high):
+            bucket = self._buckets.get(key)
+            if bucket:
+                yield from tuple(bucket)
+
+
+class NameIndex:
+    # Surikiuoti pavadinimai paieškai pagal pradžią. Nauji pavadinimai
+    # sujungiami tik prireikus, ištrinti pašalinami perstatant sąrašą.
+    # lock - Valdymas užraktas: add()/remove() kviečiami jį laikant, o
+    # užklausos sujungimą ir skaitymą atlieka po juo pačios
+    def __init__(self, lock=nullcontext()):
+        self._lock = lock
+        self._sorted = []
+        self._pending = []
+        self._stale = 0
+
+    def add(self, name):
+        self._pending.append(name)
+
+    def remove(self, name):
+        self._stale += 1
+
+    def _merge(self, live):
+        if self._stale > len(self._sorted) // 2 or \
+                len(self._pending) > len(self._sorted) // 8:
+            self._sorted = sorted(live)
+            self._stale = 0
+        else:
+            for name in self._pending:
+                i = bisect_left(self._sorted, name)
+                if i == len(self._sorted) or self._sorted[i] != name:
+                    self._sorted.insert(i, name)
+        self._pending = []
+
+    def _bounds(self, prefix, live):
+        if self._pending or self._stale:
+            self._merge(live)
+        return (bisect_left(self._sorted, prefix),
+                bisect_left(self._sorted, prefix + "\U0010ffff"))
+
+    def count(self, prefix, live):
+        with self._lock:
+            start, end = self._bounds(prefix, live)
+        return end - start
+
+    def prefix(self, prefix, live):
+        with self._lock:
+            start, end = self._bounds(prefix, live)
+            devices = [device for name in self._sorted[start:end]
+                       for device in live.get(name, ())]
+        return iter(devices)
+
+
+class Query:
+    # estimate() grąžina apytikslį kandidatų skaičių pagal indeksą arba None,
+    # jei indekso nėra (tada tikrinami visi įrenginiai)
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def matches(self, device):
+        raise NotImplementedError
+
+    def estimate(self, valdymas):
+        return None
+
+    def candidates(self, valdymas):
+        raise NotImplementedError
+
+    def run(self, valdymas):
+        if self.estimate(valdymas) is None:
+            return (device for device in valdymas.devices if self.matches(device))
+        return self.candidates(valdymas)
+
+
+class TypeIs(Query):
+    def __init__(self, device_class):
+        self.device_class = device_class
+
+    def matches(self, device):
+        return type(device) is self.device_class
+
+    def estimate(self, valdymas):
+        return len(valdymas.type_index(self.device_class))
+
+    def candidates(self, valdymas):
+        return iter(tuple(valdymas.type_index(self.device_class)))
+
+
+class StatusIs(Query):
+    def __init__(self, status):
+        self.status = bool(status)
+
+    def matches(self, device):
+        return bool(device.is_on()) == self.status
+
+    def estimate(self, valdymas):
+        return len(valdymas.status_index(self.status))
+
+    def candidates(self, valdymas):
+        return iter(tuple(valdymas.status_index(self.status)))
+
+
+class NameStartsWith(Query):
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def matches(self, device):
+        return device.get_name().startswith(self.prefix)
+
+    def estimate(self, valdymas):
+        index, live = valdymas.name_index()
+        return index.count(self.prefix, live)
+
+    def candidates(self, valdymas):
+        index, live = valdymas.name_index()
+        return index.prefix(self.prefix, live)
+
+
+class Between(Query):
+    # low <= parametras <= high; None reiškia, kad riba nenurodyta
+    def __init__(self, attr, low=None, high=None):
+        self.attr = attr
+        self.low = low
+        self.high = high
+        self._slot = "_" + attr
+
+    def matches(self, device):
+        value = getattr(device, self._slot, None)
+        if value is None:
+            return False
+        try:
+            return ((self.low is None or value >= self.low)
+                    and (self.high is None or value <= self.high))
+        except TypeError:
+            # Ne skaitinis to paties pavadinimo laukas (pvz. įskiepio tipo)
+            return False
+
+    def estimate(self, valdymas):
+        index = valdymas.value_index(self.attr)
+        return None if index is None else index.count(self.low, self.high)
+
+    def candidates(self, valdymas):
+        return valdymas.value_index(self.attr).range(self.low, self.high)
+
+
+class And(Query):
+    def __init__(self, *queries):
+        self.queries = queries
+
+    def matches(self, device):
+        return all(query.matches(device) for query in self.queries)
+
+    def _best(self, valdymas):
+        best = best_estimate = None
+        for query in self.queries:
+            estimate = query.estimate(valdymas)
+            if estimate is not None and (best is None or estimate < best_estimate):
+                best, best_estimate = query, estimate
+        return best, best_estimate
+
+    def estimate(self, valdymas):
+        return self._best(valdymas)[1]
+
+    def candidates(self, valdymas):
+        # Kandidatai imami iš siauriausio indekso, likusios sąlygos tikrinamos
+        best = self._best(valdymas)[0]
+        rest = [query for query in self.queries if query is not best]
+        return (device for device in best.candidates(valdymas)
+                if all(query.matches(device) for query in rest))
+
+
+class Or(Query):
+    def __init__(self, *queries):
+        self.queries = queries
+
+    def matches(self, device):
+        return any(query.matches(device) for query in self.queries)
+
+    def estimate(self, valdymas):
+        total = 0
+        for query in self.queries:
+            estimate = query.estimate(valdymas)
+            if estimate is None:
+                return None
+            total += estimate
+        return total
+
+    def candidates(self, valdymas):
+        seen = set()
+        for query in self.queries:
+            for device in query.candidates(valdymas):
+                if device not in seen:
+                    seen.add(device)
+                    yield device
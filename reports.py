@@ -0,0 +1,109 @@
+import json
+import threading
+from collections import namedtuple
+
+
+# Ataskaitos dalis: Valdymas versija, kurią ji atspindi, eilutės ir
+# (puslapiui) kiek įrenginių iš viso
+Page = namedtuple("Page", ["version", "number", "pages", "total", "lines"])
+Delta = namedtuple("Delta", ["version", "lines", "deleted"])
+
+FORMATS = ("text", "jsonl")
+
+
+class StatusReport:
+    # Įrenginių būsenos ataskaita su kiekvieno įrenginio eilutės podėliu.
+    # Eilutė perskaičiuojama tik pasikeitus įrenginio versijai, o visa
+    # ataskaita - tik pasikeitus Valdymas versijai. format - "text" (kaip
+    # device_info()) arba "jsonl" (device_record() kaip JSON eilutė)
+    def __init__(self, valdymas):
+        self._valdymas = valdymas
+        self._lock = threading.Lock()
+        # pavadinimas -> [versija, tekstas, json arba None]. Pavadinimai
+        # unikalūs, o versija - visos Valdymas, todėl naujas to paties
+        # pavadinimo įrenginys seno įrašo nepanaudos
+        self._lines = {}
+        self._version = None
+        self._full = {}
+
+    def _line(self, device, format):
+        version = device.get_version()
+        name = device.get_name()
+        entry = self._lines.get(name)
+        if entry is None or entry[0] != version:
+            entry = self._lines[name] = [version, device.device_info(), None]
+        if format == "text":
+            return entry[1]
+        if entry[2] is None:
+            entry[2] = json.dumps(self._valdymas.device_record(device),
+                                  ensure_ascii=False)
+        return entry[2]
+
+    def _refresh(self):
+        version = self._valdymas.version
+        if version == self._version:
+            return
+        if self._version is not None:
+            for name in self._valdymas.changes_since(self._version).deleted:
+                self._lines.pop(name, None)
+        if len(self._lines) > len(self._valdymas):
+            # Ištrintųjų istorija galėjo būti pamiršta (forget_changes)
+            live = {device.get_name() for device in self._valdymas.devices}
+            self._lines = {name: entry for name, entry in self._lines.items()
+                           if name in live}
+        self._version = version
+        self._full = {}
+
+    def _check(self, format):
+        if format not in FORMATS:
+            raise ValueError(f"Nežinomas ataskaitos formatas: {format}")
+
+    def lines(self, format="text"):
+        self._check(format)
+        with self._lock:
+            self._refresh()
+            return [self._line(device, format) for device in self._valdymas.devices]
+
+    def render(self, format="text"):
+        self._check(format)
+        with self._lock:
+            self._refresh()
+            full = self._full.get(format)
+            if full is None:
+                full = self._full[format] = "\n".join(
+                    self._line(device, format) for device in self._valdymas.devices)
+            return full
+
+    def page(self, number, size=50, format="text"):
+        # number skaičiuojamas nuo 1
+        self._check(format)
+        if number < 1 or size < 1:
+            raise ValueError("Puslapio numeris ir dydis turi būti teigiami")
+        with self._lock:
+            self._refresh()
+            devices = self._valdymas.devices
+            start = (number - 1) * size
+            lines = [self._line(device, format)
+                     for device in devices[start:start + size]]
+            return Page(self._version, number, -(-len(devices) // size),
+                        len(devices), lines)
+
+    def delta(self, since, format="text"):
+        # Pasikeitusių (ir naujų) įrenginių eilutės bei ištrintų pavadinimai
+        # nuo versijos since; kitam kartui naudoti grąžintą version. Jei
+        # ištrintųjų istorija nuo since jau pamiršta - ValueError (reikia
+        # pilnos ataskaitos)
+        self._check(format)
+        if since < self._valdymas.forgotten_version:
+            raise ValueError(f"Versija {since} per sena, gaukite visą ataskaitą")
+        with self._lock:
+            self._refresh()
+            changes = self._valdymas.changes_since(since)
+            return Delta(changes.version,
+                         [self._line(device, format) for device in changes.changed],
+                         changes.deleted)
+
+    def print(self, format="text", file=None):
+        text = self.render(format)
+        if text:
+            print(text, file=file)
@@ -0,0 +1,220 @@
+import threading
+import time
+
+from events import Event
+
+
+class Rule:
+    # Taisyklė: kai įvyksta pakeitimas attr (pvz. "locked", "temperature"),
+    # o įrenginys ir sąlyga tinka - vykdomas veiksmas. Įrenginys nurodomas
+    # pavadinimu (device), tipu (device_type) arba nenurodomas visai.
+    # condition - {"equals": v}, {"above": x}, {"below": x} naujai reikšmei
+    # arba funkcija event -> bool. action - {"device": ..., "set": {...}},
+    # {"scene": ...} arba funkcija (valdymas, event).
+    # debounce > 0 - per tiek sekundžių nuo pirmo pakeitimo atėję to paties
+    # įrenginio pakeitimai sujungiami; sąlyga tikrinama galutinei reikšmei ir
+    # veiksmas įvykdomas daugiausia vieną kartą (RulesEngine.tick())
+    def __init__(self, name, attr, action, device=None, device_type=None,
+                 condition=None, debounce=0):
+        self.name = name
+        self.attr = attr
+        self.action = action
+        self.device = device
+        self.device_type = device_type
+        self.condition = condition
+        self.debounce = debounce
+
+    @classmethod
+    def from_dict(cls, data):
+        when = dict(data["when"])
+        attr = when.pop("attr")
+        device = when.pop("device", None)
+        device_type = when.pop("type", None)
+        return cls(data["name"], attr, data["then"], device, device_type,
+                   when or None, data.get("debounce", 0))
+
+    def to_dict(self):
+        when = {"attr": self.attr}
+        if self.device is not None:
+            when["device"] = self.device
+        if self.device_type is not None:
+            when["type"] = self.device_type
+        if self.condition is not None and not callable(self.condition):
+            when.update(self.condition)
+        data = {"name": self.name, "when": when, "then": self.action}
+        if self.debounce:
+            data["debounce"] = self.debounce
+        return data
+
+    def matches(self, event):
+        condition = self.condition
+        if condition is None:
+            return True
+        if callable(condition):
+            return condition(event)
+        value = event.new
+        if "equals" in condition and value != condition["equals"]:
+            return False
+        if "above" in condition and not value > condition["above"]:
+            return False
+        return "below" not in condition or value < condition["below"]
+
+    def run(self, valdymas, event):
+        action = self.action
+        if callable(action):
+            action(valdymas, event)
+        elif "scene" in action:
+            valdymas.apply_scene(action["scene"])
+        else:
+            device = valdymas.get_device(action["device"])
+            # Įrenginys galėjo būti ištrintas
+            if device is not None:
+                for attr, value in action["set"].items():
+                    device.set_param(attr, value)
+
+
+class RulesEngine:
+    # Taisyklės indeksuojamos pagal (pavadinimas, attr), (tipas, attr) ir
+    # attr, todėl pakeitimas kainuoja O(tinkančių taisyklių), o ne O(visų).
+    # Veiksmai vykdomi iškart, tos pačios gijos viduje; jei taisyklė per
+    # savo veiksmų grandinę paleidžia pati save (ar grandinė per ilga),
+    # ji praleidžiama ir siunčiamas "rule_loop" pranešimas
+    def __init__(self, valdymas, rules=(), clock=time.monotonic, max_depth=8):
+        self._valdymas = valdymas
+        self.clock = clock
+        self.max_depth = max_depth
+        self._rules = {}
+        self._by_device = {}
+        self._by_type = {}
+        self._by_attr = {}
+        # (taisyklės pavadinimas, įrenginys) -> [terminas, įvykis, grandinė];
+        # pildoma iš įvykių gijų, skaitoma tick() - todėl su užraktu
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._local = threading.local()
+        self.fired = 0
+        self.suppressed = 0
+        for rule in rules:
+            self.add(rule)
+        valdymas.subscribe(self._on_event)
+
+    def close(self):
+        self._valdymas.unsubscribe(self._on_event)
+
+    def _index(self, rule):
+        if rule.device is not None:
+            return self._by_device, (rule.device, rule.attr)
+        if rule.device_type is not None:
+            return self._by_type, (rule.device_type, rule.attr)
+        return self._by_attr, rule.attr
+
+    def add(self, rule):
+        if rule.name in self._rules:
+            self.remove(rule.name)
+        self._rules[rule.name] = rule
+        index, key = self._index(rule)
+        index.setdefault(key, {})[rule] = None
+
+    def remove(self, name):
+        rule = self._rules.pop(name)
+        index, key = self._index(rule)
+        del index[key][rule]
+        if not index[key]:
+            del index[key]
+        with self._pending_lock:
+            for key in [key for key in self._pending if key[0] == name]:
+                del self._pending[key]
+
+    def get(self, name):
+        try:
+            return self._rules[name]
+        except KeyError:
+            raise ValueError(f"Nerasta taisyklė: {name}") from None
+
+    def names(self):
+        return list(self._rules)
+
+    def load(self, filename):
+        import json
+
+        with open(filename, "r", encoding="utf-8") as f:
+            for data in json.load(f):
+                self.add(Rule.from_dict(data))
+
+    def matching(self, event):
+        kind = event.kind
+        rules = list(self._by_attr.get(kind, ()))
+        device = event.device
+        if device is not None:
+            rules.extend(self._by_device.get((device.get_name(), kind), ()))
+            rules.extend(self._by_type.get((type(device).__name__, kind), ()))
+        return rules
+
+    def _chain(self):
+        chain = getattr(self._local, "chain", None)
+        if chain is None:
+            chain = self._local.chain = []
+        return chain
+
+    def _on_event(self, event):
+        # Setter'iai praneša ir tada, kai reikšmė nepasikeitė; į tai nereaguojama
+        if event.old == event.new and event.kind not in ("added", "deleted"):
+            return
+        for rule in self.matching(event):
+            if not rule.debounce:
+                if rule.matches(event):
+                    self._fire(rule, event)
+                continue
+            # Sujungiami visi pakeitimai, ir netinkantys sąlygai: jei
+            # pliūpsnis baigiasi netinkama reikšme, veiksmas nevykdomas
+            key = (rule.name, event.device)
+            with self._pending_lock:
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = [self.clock() + rule.debounce, event,
+                                          tuple(self._chain())]
+                else:
+                    # Sena reikšmė iš pirmo, nauja - iš paskutinio
+                    first = pending[1]
+                    pending[1] = Event(event.kind, event.device, first.old, event.new)
+
+    def next_deadline(self):
+        with self._pending_lock:
+            return min((pending[0] for pending in self._pending.values()),
+                       default=None)
+
+    def tick(self):
+        # Įvykdo taisykles, kurių sujungimo langas baigėsi ir kurių sąlyga
+        # tinka galutinei reikšmei; grąžina įvykdytų skaičių. Grandinė
+        # atkuriama, kad ciklai būtų aptikti ir per atidėtas taisykles
+        now = self.clock()
+        with self._pending_lock:
+            due = [(key, self._pending.pop(key)) for key, pending
+                   in list(self._pending.items()) if pending[0] <= now]
+        fired = 0
+        for (name, _), (_, event, chain) in due:
+            rule = self._rules.get(name)
+            # Pliūpsnis galėjo grąžinti pradinę reikšmę
+            if rule is None or event.old == event.new or not rule.matches(event):
+                continue
+            saved = self._chain()
+            self._local.chain = list(chain)
+            try:
+                self._fire(rule, event)
+            finally:
+                self._local.chain = saved
+            fired += 1
+        return fired
+
+    def _fire(self, rule, event):
+        chain = self._chain()
+        if rule in chain or len(chain) >= self.max_depth:
+            self.suppressed += 1
+            self._valdymas._emit("rule_loop", event.device, None, rule.name)
+            return
+        chain.append(rule)
+        try:
+            rule.run(self._valdymas, event)
+            self.fired += 1
+        finally:
+            chain.pop()
@@ -0,0 +1,144 @@
+class Scene:
+    # Scena - tai duomenys: kokią būseną turi įgauti kiekvieno tipo
+    # įrenginiai, pvz. {"Light": {"status": False}, "Door": {"locked": True}}.
+    # selector atrenka įrenginius: {"names": [...]}, {"name_prefix": "..."}
+    # arba funkcija device -> bool. Jis turi priklausyti tik nuo nekintančių
+    # savybių (pavadinimo, tipo), nes sukompiliuotas planas saugomas
+    def __init__(self, name, targets, selector=None):
+        self.name = name
+        self.targets = targets
+        self.selector = selector
+
+    @classmethod
+    def from_dict(cls, data):
+        # Duomenys gali ateiti iš failo ar tinklo, todėl struktūra tikrinama
+        if not isinstance(data, dict):
+            raise ValueError("Scena turi būti JSON objektas")
+        targets = data.get("targets")
+        if (not isinstance(data.get("name"), str) or not isinstance(targets, dict)
+                or not all(isinstance(params, dict) for params in targets.values())):
+            raise ValueError("Scenai reikia pavadinimo ir targets: {tipas: {parametras: reikšmė}}")
+        selector = data.get("selector")
+        if selector is not None and not isinstance(selector, dict):
+            raise ValueError("Scenos selector turi būti JSON objektas")
+        return cls(data["name"], targets, selector)
+
+    def to_dict(self):
+        data = {"name": self.name, "targets": self.targets}
+        if self.selector is not None and not callable(self.selector):
+            data["selector"] = self.selector
+        return data
+
+    def selects(self, device):
+        selector = self.selector
+        if selector is None:
+            return True
+        if callable(selector):
+            return selector(device)
+        name = device.get_name()
+        if "names" in selector and name not in selector["names"]:
+            return False
+        prefix = selector.get("name_prefix")
+        return prefix is None or name.startswith(prefix)
+
+
+class SceneReport:
+    def __init__(self, scene, matched, changes):
+        self.scene = scene
+        self.matched = matched
+        # (įrenginys, parametras, sena reikšmė, nauja reikšmė)
+        self.changes = changes
+
+    @property
+    def changed(self):
+        return len(self.changes)
+
+    @property
+    def by_type(self):
+        counts = {}
+        for device, _, _, _ in self.changes:
+            type_name = type(device).__name__
+            counts[type_name] = counts.get(type_name, 0) + 1
+        return counts
+
+
+LEAVE_HOME = Scene("leavehome", {
+    "Light": {"status": False},
+    "TV": {"status": False},
+    "AirConditioner": {"status": False},
+    "Door": {"locked": True},
+    "Camera": {"status": True},
+})
+
+BUILTIN_SCENES = (LEAVE_HOME,)
+
+
+class SceneEngine:
+    # Scena sukompiliuojama į veiksmų planą: kiekvienam atrinktam įrenginiui
+    # iš anksto parenkamas metodas, atributas ir norima reikšmė. Planas
+    # perskaičiuojamas tik pasikeitus įrenginių sąrašui
+    def __init__(self, valdymas, scenes=BUILTIN_SCENES):
+        self._valdymas = valdymas
+        self._scenes = {}
+        self._plans = {}
+        for scene in scenes:
+            self.register(scene)
+
+    def register(self, scene):
+        self._scenes[scene.name] = scene
+        self._plans.pop(scene.name, None)
+
+    def get(self, name):
+        try:
+            return self._scenes[name]
+        except KeyError:
+            raise ValueError(f"Nerasta scena: {name}") from None
+
+    def names(self):
+        return list(self._scenes)
+
+    def load(self, filename):
+        import json
+
+        with open(filename, "r", encoding="utf-8") as f:
+            for data in json.load(f):
+                self.register(Scene.from_dict(data))
+
+    def _compile(self, scene):
+        actions_by_type = {}
+        for device_class in self._valdymas.device_types():
+            params = scene.targets.get(device_class.__name__)
+            if params:
+                actions_by_type[device_class] = tuple(
+                    (device_class.setter(attr), "_" + attr, attr, value)
+                    for attr, value in params.items())
+        plan = []
+        for device in self._valdymas.devices:
+            actions = actions_by_type.get(type(device))
+            if actions and scene.selects(device):
+                plan.append((device, actions))
+        return plan
+
+    def plan(self, scene):
+        if isinstance(scene, str):
+            scene = self.get(scene)
+        generation = self._valdymas.generation
+        cached = self._plans.get(scene.name)
+        if (cached is None or cached[0] != generation
+                or cached[1] is not scene):
+            cached = (generation, scene, self._compile(scene))
+            self._plans[scene.name] = cached
+        return scene, cached[2]
+
+    def apply(self, scene):
+        scene, plan = self.plan(scene)
+        changes = []
+        for device, actions in plan:
+            for setter, slot, attr, value in actions:
+                old = getattr(device, slot)
+                if old != value:
+                    setter(device, value)
+                    new = getattr(device, slot)
+                    if new != old:
+                        changes.append((device, attr, old, new))
+        return SceneReport(scene.name, len(plan), changes)
@@ -0,0 +1,271 @@
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+
+class SimulatedClock:
+    # Laikrodis testams: laikas juda tik iškvietus advance()
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class Job:
+    # action - {"device": ..., "set": {...}}, {"scene": ...},
+    # {"bulk": {"Door": {"locked": True}}} arba funkcija valdymas -> None
+    # (tokia užduotis į failą neišsaugoma). every - kartojimo intervalas s
+    def __init__(self, job_id, when, action, every=None):
+        self.id = job_id
+        self.when = when
+        self.action = action
+        self.every = every
+
+    def to_dict(self):
+        data = {"id": self.id, "when": self.when, "action": self.action}
+        if self.every:
+            data["every"] = self.every
+        return data
+
+
+def _check_action(action):
+    if callable(action):
+        return
+    if not isinstance(action, dict) or not (
+            "scene" in action or "bulk" in action
+            or ("device" in action and "set" in action)):
+        raise ValueError(f"Netinkamas veiksmas: {action}")
+
+
+class Scheduler:
+    # Užduotys laikomos krūvoje pagal laiką (atšauktos iš krūvos išmetamos
+    # tik priėjus jų eilei). Tuo pačiu momentu suveikiančios užduotys
+    # vykdomos kartu: vienodi to paties tipo įrenginių pakeitimai taikomi
+    # grupe (metodas parenkamas vieną kartą), vienodos scenos - vieną kartą.
+    # Laukiančios užduotys saugomos filename faile (šalia devices.json):
+    # suveikus užduotims failas perrašomas ne dažniau kaip kas save_interval
+    # sekundžių (ir visada per close()), kad daug užduočių nekainuotų
+    # O(užduočių) įrašymo po kiekvieno paketo
+    def __init__(self, valdymas, filename="schedule.json", clock=time.time,
+                 save_interval=5.0):
+        self._valdymas = valdymas
+        self.filename = filename
+        self.clock = clock
+        self.save_interval = save_interval
+        self._last_save = None
+        self._lock = threading.RLock()
+        self._heap = []
+        self._jobs = {}
+        self._next_id = 1
+        self._dirty = False
+        self._wakeup = threading.Event()
+        self.batches = 0
+        # Paskutinės nepavykusios užduotys: (užduoties id, klaida)
+        self.errors = deque(maxlen=100)
+        if filename is not None and os.path.exists(filename):
+            self.load()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.when, job.id))
+
+    def at(self, when, action, every=None):
+        _check_action(action)
+        if not callable(action) and "scene" in action:
+            # Nežinoma scena (pvz. rašybos klaida) atmetama iškart
+            self._valdymas.scenes.get(action["scene"])
+        if every is not None and every <= 0:
+            raise ValueError("Kartojimo intervalas turi būti teigiamas")
+        with self._lock:
+            job = Job(self._next_id, when, action, every)
+            self._next_id += 1
+            self._jobs[job.id] = job
+            self._push(job)
+            self._dirty = True
+        self._wakeup.set()
+        return job.id
+
+    def after(self, delay, action, every=None):
+        return self.at(self.clock() + delay, action, every)
+
+    def daily(self, hour, minute, action):
+        # Kasdien nurodytu vietos laiku, pvz. daily(23, 0, ...)
+        now = datetime.fromtimestamp(self.clock())
+        first = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if first <= now:
+            first += timedelta(days=1)
+        return self.at(first.timestamp(), action, every=24 * 60 * 60)
+
+    def cancel(self, job_id):
+        with self._lock:
+            removed = self._jobs.pop(job_id, None) is not None
+            self._dirty = self._dirty or removed
+        return removed
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def next_time(self):
+        with self._lock:
+            while self._heap:
+                when, job_id = self._heap[0]
+                job = self._jobs.get(job_id)
+                if job is not None and job.when == when:
+                    return when
+                heapq.heappop(self._heap)
+        return None
+
+    def run_pending(self, now=None):
+        # Įvykdo visas užduotis, kurių laikas atėjo; grąžina jų skaičių
+        now = self.clock() if now is None else now
+        batches = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, job_id = heapq.heappop(self._heap)
+                job = self._jobs.get(job_id)
+                if job is None or job.when != when:
+                    continue
+                if batches and batches[-1][0] == when:
+                    batches[-1][1].append(job)
+                else:
+                    batches.append((when, [job]))
+                if job.every:
+                    # Praleisti kartai neįvykdomi po kelis kartus
+                    while job.when <= now:
+                        job.when += job.every
+                    self._push(job)
+                else:
+                    del self._jobs[job.id]
+                self._dirty = True
+        # Iš krūvos jau išimtos užduotys išsaugomos net ir įvykus klaidai
+        try:
+            for _, jobs in batches:
+                self._run_batch(jobs)
+        finally:
+            self._save_if_due()
+        return sum(len(jobs) for _, jobs in batches)
+
+    def _attempt(self, jobs, function, *args):
+        # Nepavykęs veiksmas nestabdo kitų: klaida įsimenama ir pranešama
+        try:
+            function(*args)
+        except Exception as error:
+            for job in jobs:
+                self.errors.append((job.id, error))
+                self._valdymas._emit("job_failed", None, None, f"{job.id}: {error}")
+
+    def _run_batch(self, jobs):
+        valdymas = self._valdymas
+        # Sujungiami veiksmai ir juos sudarančios užduotys (klaidoms)
+        sets = {}
+        bulks = {}
+        scenes = {}
+        for job in jobs:
+            action = job.action
+            if callable(action):
+                self._attempt([job], action, valdymas)
+            elif "scene" in action:
+                scenes.setdefault(action["scene"], []).append(job)
+            elif "bulk" in action:
+                key = json.dumps(action["bulk"], sort_keys=True)
+                bulks.setdefault(key, (action["bulk"], []))[1].append(job)
+            else:
+                device = valdymas.get_device(action["device"])
+                # Įrenginys galėjo būti ištrintas
+                if device is not None:
+                    key = (type(device), tuple(sorted(action["set"].items())))
+                    devices, set_jobs = sets.setdefault(key, ({}, []))
+                    devices[device] = None
+                    set_jobs.append(job)
+        for (device_class, params), (devices, set_jobs) in sets.items():
+            self._attempt(set_jobs, self._apply_set, device_class, dict(params), devices)
+        if bulks:
+            classes = {device_class.__name__: device_class
+                       for device_class in valdymas.device_types()}
+            for bulk, bulk_jobs in bulks.values():
+                self._attempt(bulk_jobs, valdymas.apply_changes,
+                              {classes[name]: params for name, params in bulk.items()
+                               if name in classes})
+        for scene, scene_jobs in scenes.items():
+            self._attempt(scene_jobs, valdymas.apply_scene, scene)
+        self.batches += 1
+
+    def _apply_set(self, device_class, params, devices):
+        # Metodas parenkamas vieną kartą grupei; einama tik per grupės
+        # įrenginius, jau norimos būsenos praleidžiami
+        setters = [(device_class.setter(attr), "_" + attr, value)
+                   for attr, value in params.items()]
+        for device in devices:
+            for setter, slot, value in setters:
+                if getattr(device, slot) != value:
+                    setter(device, value)
+
+    def run_until(self, when):
+        # Su SimulatedClock: laikas sukamas nuo vienos užduoties iki kitos
+        while True:
+            next_time = self.next_time()
+            if next_time is None or next_time > when:
+                break
+            self.clock.now = max(self.clock.now, next_time)
+            self.run_pending()
+        self.clock.now = max(self.clock.now, when)
+
+    def run_forever(self, stop, max_wait=60.0):
+        # Tikram laikui: miegama iki artimiausios užduoties; stop -
+        # threading.Event. Nauja užduotis pažadina anksčiau
+        while not stop.is_set():
+            self.run_pending()
+            next_time = self.next_time()
+            wait = max_wait if next_time is None else min(
+                max(next_time - self.clock(), 0), max_wait)
+            if self._dirty and self.filename is not None:
+                # Neišsaugoti pakeitimai įrašomi ir tada, kai nieko nesuveikia
+                wait = min(wait, self.save_interval)
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _save_if_due(self):
+        now = time.monotonic()
+        if (self._dirty and (self._last_save is None
+                             or now - self._last_save >= self.save_interval)):
+            self.save()
+
+    def save(self):
+        if self.filename is None:
+            return
+        with self._lock:
+            self._last_save = time.monotonic()
+            if not self._dirty:
+                return
+            data = {"next_id": self._next_id,
+                    "jobs": [job.to_dict() for job in self._jobs.values()
+                             if not callable(job.action)]}
+            self._dirty = False
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.filename)
+
+    def load(self):
+        with open(self.filename, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            self._next_id = max(self._next_id, data["next_id"])
+            for item in data["jobs"]:
+                job = Job(item["id"], item["when"], item["action"], item.get("every"))
+                self._jobs[job.id] = job
+                self._push(job)
+
+    def close(self):
+        self._wakeup.set()
+        self.save()
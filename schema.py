@@ -0,0 +1,275 @@
+# Lauko tipas -> (Python tipo patikra, dvejetainio formato struct kodas)
+TYPES = {
+    "int": ("type(v) is int", "i"),
+    "float": ("type(v) is float or type(v) is int", "d"),
+    "bool": ("type(v) is bool", "?"),
+    "str": ("type(v) is str", "s"),
+}
+
+REQUIRED = object()
+
+# Device atributai (_name, _status, ...), kurių laukai negali perrašyti
+RESERVED = ("name", "status", "owner", "version")
+
+# Registruotos schemos pagal tipo pavadinimą (pildo main.DeviceFactory)
+SCHEMAS = {}
+
+
+class Field:
+    # Meniu (main()) rodoma tik lietuviškai: label - lauko pavadinimas
+    # (pvz. "garso lygis"), prompt - klausimas reikšmei įvesti, values -
+    # žodžiai, kuriais reikšmė pasirenkama iškart (pvz. {"užrakinti": True})
+    def __init__(self, name, type="int", default=REQUIRED, min=None, max=None,
+                 choices=None, prompt=None, label=None, values=None):
+        if type not in TYPES:
+            raise ValueError(f"Nežinomas lauko tipas: {type}")
+        # Pavadinimas naudojamas generuojamame kode
+        if not name.isidentifier():
+            raise ValueError(f"Netinkamas lauko pavadinimas: {name}")
+        self.name = name
+        self.type = type
+        self.default = default
+        self.min = min
+        self.max = max
+        self.choices = tuple(choices) if choices is not None else None
+        self.label = label or name
+        self.prompt = prompt or f"Įveskite {self.label}: "
+        self.values = dict(values) if values is not None else None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data.get("type", "int"),
+                   data.get("default", REQUIRED), data.get("min"), data.get("max"),
+                   data.get("choices"), data.get("prompt"), data.get("label"),
+                   data.get("values"))
+
+    def to_dict(self):
+        data = {"name": self.name, "type": self.type, "label": self.label}
+        for key in ("min", "max", "choices", "prompt", "values"):
+            if getattr(self, key) is not None:
+                data[key] = getattr(self, key)
+        if self.default is not REQUIRED:
+            data["default"] = self.default
+        return data
+
+    @property
+    def code(self):
+        return TYPES[self.type][1]
+
+    @property
+    def numeric(self):
+        return self.type in ("int", "float")
+
+    def condition(self):
+        # Patikra kaip Python išraiška kintamajam v
+        parts = [TYPES[self.type][0]]
+        if self.min is not None:
+            parts.append(f"v >= {self.min!r}")
+        if self.max is not None:
+            parts.append(f"v <= {self.max!r}")
+        if self.choices is not None:
+            parts.append(f"v in {self.choices!r}")
+        return " and ".join(f"({part})" for part in parts)
+
+    def parse(self, text):
+        # Meniu įvesties (eilutės) pavertimas lauko tipu
+        word = text.strip().lower()
+        if self.values is not None and word in self.values:
+            return self.values[word]
+        if self.type == "bool":
+            return word in ("true", "taip", "1")
+        if self.type == "str":
+            return text
+        return int(text) if self.type == "int" else float(text)
+
+
+def _compile(source, namespace, name):
+    exec(compile(source, f"<schema {name}>", "exec"), namespace)
+
+
+class DeviceSchema:
+    # Įrenginio tipo aprašas: laukai (tipai, ribos, numatytosios reikšmės) ir
+    # device_info() šablonas. compile() vieną kartą sugeneruoja tipui
+    # konstruktorių su patikromis, įrašo (devices.json) kodavimą ir dekodavimą,
+    # todėl įkeliant failą nėra jokio isinstance ar getattr per įrašą.
+    # Generuojama tik pirmą kartą prireikus, kad "import main" liktų pigus.
+    # device_class nenurodžius klasė sukuriama iš schemos; label - tipo
+    # pavadinimas meniu (pvz. "Kondicionierius")
+    def __init__(self, type_name, fields, info=None, device_class=None, label=None):
+        if not type_name.isidentifier():
+            raise ValueError(f"Netinkamas įrenginio tipas: {type_name}")
+        self.type_name = type_name
+        self.fields = tuple(fields)
+        names = [field.name for field in self.fields]
+        for name in names:
+            if name in RESERVED or names.count(name) > 1:
+                raise ValueError(f"{type_name}: netinkamas lauko pavadinimas: {name}")
+        self.info = info
+        self.device_class = device_class
+        self.label = label or type_name
+        self._checks = None
+        # Kol nesugeneruota, šios funkcijos pirmiausia iškviečia compile()
+        for name in ("create", "init", "decode", "encode"):
+            setattr(self, name, self._compile_first(name))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["type"], [Field.from_dict(field) for field in data["fields"]],
+                   data.get("info"), label=data.get("label"))
+
+    def to_dict(self):
+        data = {"type": self.type_name, "label": self.label,
+                "fields": [field.to_dict() for field in self.fields]}
+        if self.info is not None:
+            data["info"] = self.info
+        return data
+
+    @property
+    def layout(self):
+        return tuple((field.name, field.code) for field in self.fields)
+
+    def field(self, name):
+        for field in self.fields:
+            if field.name == name:
+                return field
+        return None
+
+    def valid(self, attr, value):
+        if self._checks is None:
+            self.compile()
+        check = self._checks.get(attr)
+        return check is None or check(value)
+
+    def _invalid(self, attr, value):
+        # Pranešimas rodomas meniu, todėl su lietuviškais pavadinimais
+        raise ValueError(f"{self.label}: netinkama reikšmė ({self.field(attr).label}): "
+                         f"{value!r}")
+
+    def _signature(self):
+        # Privalomi laukai pirmiau, kad būtų galima perduoti ir pozicijomis
+        required = [f.name for f in self.fields if f.default is REQUIRED]
+        optional = [f"{f.name}=_default_{f.name}" for f in self.fields
+                    if f.default is not REQUIRED]
+        return ", ".join(["name"] + required + optional)
+
+    def _compile_first(self, name):
+        def first(*args, **kwargs):
+            self.compile()
+            return getattr(self, name)(*args, **kwargs)
+        return first
+
+    def bind(self, base):
+        # Susieja schemą su klase (ją sukuria, jei reikia)
+        if self.device_class is None:
+            self.device_class = make_device_class(self, base)
+        self.device_class._schema = self
+        return self.device_class
+
+    def compile(self):
+        device_class = self.device_class
+        namespace = {"_new": object.__new__, "_cls": device_class,
+                     "_invalid": self._invalid}
+        body = []
+        for field in self.fields:
+            namespace[f"_default_{field.name}"] = field.default
+            body.append(f"    v = {field.name}")
+            body.append(f"    if not ({field.condition()}):")
+            body.append(f"        _invalid({field.name!r}, v)")
+        body += ["    device._name = name",
+                 "    device._status = False",
+                 "    device._owner = None",
+                 "    device._version = 0"]
+        body += [f"    device._{field.name} = {field.name}" for field in self.fields]
+        # create() - greitas kūrimas be __init__; init() - schemos klasės __init__
+        lines = [f"def create({self._signature()}):", "    device = _new(_cls)"]
+        lines += body + ["    return device"]
+        lines += [f"def init(device, {self._signature()}):"] + body
+
+        # decode() atkuria išsaugotas reikšmes be ribų patikrų: failas galėjo
+        # būti įrašytas su senesnėmis ribomis, o įkėlimas dėl to neturi nutrūkti
+        lines += ["def decode(record):",
+                  "    device = _new(_cls)",
+                  "    try:",
+                  '        device._name = record["name"]']
+        for f in self.fields:
+            lines.append(f'        v = record["{f.name}"]' if f.default is REQUIRED
+                         else f'        v = record.get("{f.name}", _default_{f.name})')
+            # Tipas tikrinamas ir čia: nuo jo priklauso reikšmių indeksai
+            lines += [f"        if not ({TYPES[f.type][0]}):",
+                      f"            _invalid({f.name!r}, v)",
+                      f"        device._{f.name} = v"]
+        lines += ["    except KeyError as error:",
+                  f"        raise ValueError('{self.type_name}: trūksta lauko '"
+                  " + str(error.args[0])) from None",
+                  '    device._status = bool(record.get("status", False))',
+                  "    device._owner = None",
+                  "    device._version = 0",
+                  "    return device"]
+
+        items = "".join(f'"{f.name}": device._{f.name}, ' for f in self.fields)
+        lines += ["def encode(device):",
+                  f'    return {{"type": {self.type_name!r}, "name": device._name, '
+                  f'"status": device._status, {items}}}']
+
+        for field in self.fields:
+            lines += [f"def check_{field.name}(v):",
+                      f"    return {field.condition()}"]
+        _compile("\n".join(lines) + "\n", namespace, self.type_name)
+        self.create = namespace["create"]
+        self.init = namespace["init"]
+        self.decode = namespace["decode"]
+        self.encode = namespace["encode"]
+        self._checks = {field.name: namespace[f"check_{field.name}"]
+                        for field in self.fields}
+        return self
+
+
+def make_device_class(schema, base):
+    # Įrenginio klasė pagal schemą: laukai __slots__, get_/set_ metodai ir
+    # device_info() pagal schema.info šabloną
+    fields = schema.fields
+    info = schema.info or "{name} - Būsena: {status}" + "".join(
+        f", {field.name}: {{{field.name}}}" for field in fields)
+
+    def __init__(self, name, *args, **kwargs):
+        self._schema.init(self, name, *args, **kwargs)
+
+    def device_info(self):
+        values = {field.name: getattr(self, "_" + field.name) for field in fields}
+        return info.format(name=self._name, status="ON" if self._status else "OFF",
+                           **values)
+
+    def make_setter(attr):
+        def setter(self, value):
+            self._set_valid(attr, value)
+        return setter
+
+    def make_getter(slot):
+        return lambda self: getattr(self, slot)
+
+    for field in fields:
+        for method in ("get_" + field.name, "set_" + field.name):
+            if hasattr(base, method):
+                raise ValueError(f"{schema.type_name}: laukas {field.name} "
+                                 f"perrašytų metodą {method}")
+    slots = tuple("_" + field.name for field in fields)
+    namespace = {"__slots__": slots, "__init__": __init__,
+                 "device_info": device_info,
+                 "_setters": {**base._setters,
+                              **{field.name: "set_" + field.name for field in fields}}}
+    for field in fields:
+        namespace["get_" + field.name] = make_getter("_" + field.name)
+        namespace["set_" + field.name] = make_setter(field.name)
+    return type(schema.type_name, (base,), namespace)
+
+
+def layouts():
+    # Dvejetainio formato (formats.py) laukų aprašai pagal tipą
+    return {type_name: schema.layout for type_name, schema in SCHEMAS.items()}
+
+
+def load_schemas(filename):
+    import json
+
+    with open(filename, "r", encoding="utf-8") as f:
+        return [DeviceSchema.from_dict(data) for data in json.load(f)]
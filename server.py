@@ -0,0 +1,323 @@
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote
+
+from query import And, Between, NameStartsWith, StatusIs, TypeIs
+from scenes import Scene
+
+
+class _Batch:
+    def __init__(self):
+        self.params = {}
+        self.writers = 0
+        self.done = threading.Event()
+        self.record = None
+        self.error = None
+
+
+class WriteCoalescer:
+    # Vienu metu atėję to paties įrenginio pakeitimai sujungiami: kol
+    # ankstesnis paketas dar taikomas, nauji parametrai kaupiami viename
+    # pakete (paskutinė reikšmė laimi) ir pritaikomi vienu kartu. Visi
+    # rašytojai gauna tą patį galutinį įrašą
+    def __init__(self, valdymas, stripes=64):
+        self._valdymas = valdymas
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flush_locks = [threading.Lock() for _ in range(stripes)]
+        self.requests = 0
+        self.flushes = 0
+
+    def _flush_lock(self, name):
+        return self._flush_locks[hash(name) % len(self._flush_locks)]
+
+    def set(self, name, params):
+        with self._lock:
+            self.requests += 1
+            batch = self._pending.get(name)
+            leader = batch is None
+            if leader:
+                batch = self._pending[name] = _Batch()
+            batch.params.update(params)
+            batch.writers += 1
+        if leader:
+            with self._flush_lock(name):
+                with self._lock:
+                    del self._pending[name]
+                    self.flushes += 1
+                try:
+                    batch.record = self._apply(name, batch.params)
+                except Exception as error:
+                    batch.error = error
+                finally:
+                    batch.done.set()
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return batch.record
+
+    def _apply(self, name, params):
+        device = self._valdymas.get_device(name)
+        if device is None:
+            raise ValueError(f"Įrenginys nerastas: {name}")
+        for attr, value in params.items():
+            device.set_param(attr, value)
+        return self._valdymas.device_record(device)
+
+
+def _summary(result):
+    return {"matched": result.matched, "changed": result.changed,
+            "by_type": result.by_type}
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "on")
+    return bool(value)
+
+
+def _number(value):
+    return None if value is None else float(value)
+
+
+class ValdymasServer:
+    # HTTP sąsaja Valdymas objektui (geriausia threadsafe.ThreadSafeValdymas,
+    # nes kiekviena jungtis aptarnaujama atskiroje gijoje). Jungtys
+    # išlaikomos (HTTP/1.1 keep-alive).
+    #   POST /rpc               komanda {"op": ...} arba jų sąrašas
+    #   GET  /devices           ?type=Light&status=true&prefix=...&attr=..&low=..&high=..
+    #   POST /devices           {"type": ..., "name": ..., parametrai}
+    #   GET|PATCH|DELETE /devices/<pavadinimas>
+    #   POST /scenes/<pavadinimas>
+    #   GET  /metrics           metrics.Metrics Prometheus formatu, jei nurodyta
+    def __init__(self, valdymas, host="127.0.0.1", port=8080, metrics=None):
+        self.valdymas = valdymas
+        self.metrics = metrics
+        self.writes = WriteCoalescer(valdymas)
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.app = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._httpd.server_address[:2]
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _query(self, command):
+        conditions = []
+        if command.get("type") is not None:
+            classes = {device_class.__name__: device_class
+                       for device_class in self.valdymas.device_types()}
+            if command["type"] not in classes:
+                return []
+            conditions.append(TypeIs(classes[command["type"]]))
+        if command.get("status") is not None:
+            conditions.append(StatusIs(_bool(command["status"])))
+        if command.get("prefix"):
+            conditions.append(NameStartsWith(command["prefix"]))
+        if command.get("attr"):
+            conditions.append(Between(command["attr"], _number(command.get("low")),
+                                      _number(command.get("high"))))
+        if not conditions:
+            devices = self.valdymas.devices
+        else:
+            query = conditions[0] if len(conditions) == 1 else And(*conditions)
+            devices = self.valdymas.query(query)
+        return [self.valdymas.device_record(device) for device in devices]
+
+    def execute(self, command):
+        op = command.get("op")
+        if op == "create":
+            params = command.get("params", {})
+            return self.valdymas.device_record(self.valdymas.create_device(
+                command["type"], command["name"], **params))
+        if op == "delete":
+            device = self.valdymas.get_device(command["name"])
+            if device is not None:
+                self.valdymas.delete_device(device)
+            return device is not None
+        if op == "get":
+            device = self.valdymas.get_device(command["name"])
+            return None if device is None else self.valdymas.device_record(device)
+        if op == "set":
+            return self.writes.set(command["name"], command["params"])
+        if op == "turn_on_all":
+            return _summary(self.valdymas.turn_on_all())
+        if op == "turn_off_all":
+            return _summary(self.valdymas.turn_off_all())
+        if op == "leavehome":
+            return _summary(self.valdymas.leavehome())
+        if op == "apply_scene":
+            scene = command["scene"]
+            if not isinstance(scene, str):
+                scene = Scene.from_dict(scene)
+            return _summary(self.valdymas.apply_scene(scene))
+        if op == "query":
+            return self._query(command)
+        if op == "info":
+            return [device.device_info() for device in self.valdymas.devices]
+        if op == "report":
+            # Pagal podėlį: pokyčiai nuo since, vienas puslapis arba viskas
+            report = self.valdymas.status_report()
+            format = command.get("format", "text")
+            if command.get("since") is not None:
+                return report.delta(int(command["since"]), format)._asdict()
+            if command.get("page") is not None:
+                return report.page(int(command["page"]), int(command.get("size", 50)),
+                                   format)._asdict()
+            return {"version": self.valdymas.version, "lines": report.lines(format)}
+        if op == "count":
+            return len(self.valdymas)
+        raise ValueError(f"Nežinoma komanda: {op}")
+
+    def call(self, command):
+        # Klaida grąžinama kaip rezultatas, kad viena bloga paketo komanda
+        # nesustabdytų kitų
+        if not isinstance(command, dict):
+            return {"error": "Komanda turi būti JSON objektas"}
+        try:
+            return {"ok": self.execute(command)}
+        except KeyError as error:
+            return {"error": f"Trūksta parametro: {error.args[0]}"}
+        except (ValueError, TypeError) as error:
+            return {"error": str(error)}
+
+    def route(self, method, parts, params, body):
+        if parts == ["rpc"] and method == "POST":
+            if isinstance(body, list):
+                return 200, [self.call(command) for command in body]
+            result = self.call(body or {})
+            return (400 if body is not None and not isinstance(body, dict)
+                    else 200), result
+        if parts == ["metrics"] and method == "GET" and self.metrics is not None:
+            return 200, self.metrics.render_prometheus()
+        if body is not None and not isinstance(body, dict):
+            return 400, {"error": "Turinys turi būti JSON objektas"}
+        if parts[0] == "devices" and len(parts) == 1:
+            if method == "GET":
+                command = {key: values[-1] for key, values in params.items()}
+                command["op"] = "query"
+            elif method == "POST":
+                body = dict(body or {})
+                command = {"op": "create", "type": body.pop("type", None),
+                           "name": body.pop("name", None), "params": body}
+            else:
+                return 405, {"error": "Netinkamas metodas"}
+        elif parts[0] == "devices" and len(parts) == 2:
+            ops = {"GET": "get", "PATCH": "set", "DELETE": "delete"}
+            if method not in ops:
+                return 405, {"error": "Netinkamas metodas"}
+            command = {"op": ops[method], "name": parts[1], "params": body or {}}
+        elif parts[0] == "scenes" and len(parts) == 2 and method == "POST":
+            command = {"op": "apply_scene", "scene": parts[1]}
+        else:
+            return 404, {"error": "Nerastas kelias"}
+        result = self.call(command)
+        if "error" in result:
+            status = 404 if result["error"].startswith("Įrenginys nerastas") else 400
+            return status, result
+        if result["ok"] is None or (command["op"] == "delete" and not result["ok"]):
+            return 404, {"error": f"Įrenginys nerastas: {parts[1]}"}
+        return 200, result["ok"]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Antraštės ir turinys rašomi atskirai; be šito keep-alive jungtyje
+    # kiekvienas atsakymas užlaikomas ~40 ms (Nagle + uždelstas ACK)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data):
+        if isinstance(data, str):
+            body = data.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        path, _, query = self.path.partition("?")
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length)) if length else None
+        except ValueError:
+            self._send(400, {"error": "Netinkamas JSON"})
+            return
+        try:
+            status, data = self.server.app.route(method, parts, parse_qs(query), body)
+        except Exception as error:
+            # Nenumatyta klaida: klientas vis tiek gauna atsakymą
+            status, data = 500, {"error": f"Vidinė serverio klaida: {error}"}
+        self._send(status, data)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def main():
+    from main import App
+    from metrics import Metrics
+    from threadsafe import ThreadSafeValdymas
+
+    parser = argparse.ArgumentParser(description="Įrenginių valdymo HTTP serveris")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    app = App(valdymas_class=ThreadSafeValdymas)
+    metrics = Metrics().attach(app.valdymas, app.journal)
+    server = ValdymasServer(app.valdymas, args.host, args.port, metrics=metrics)
+    print(f"Serveris veikia http://{args.host}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
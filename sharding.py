@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import zlib
+
+from main import BulkResult, DeviceFactory, Valdymas
+from persistence import Journal
+from scenes import Scene
+
+
+def hash_partition(name, shards):
+    # Stabili maiša (ne hash()), kad įrenginys po perkrovimo liktų tame pačiame
+    # skaidinyje
+    return zlib.crc32(name.encode("utf-8")) % shards
+
+
+def _summary(result):
+    return BulkResult(result.matched, result.changed, result.by_type)
+
+
+def _handle(valdymas, journal, op, args):
+    if op == "create":
+        device_type, name, params = args
+        return valdymas.device_record(
+            valdymas.create_device(device_type, name, **params))
+    if op == "delete":
+        device = valdymas.get_device(args)
+        if device is not None:
+            valdymas.delete_device(device)
+        return device is not None
+    if op == "get":
+        device = valdymas.get_device(args)
+        return None if device is None else valdymas.device_record(device)
+    if op == "set":
+        name, attr, value = args
+        device = valdymas.get_device(name)
+        if device is None:
+            raise ValueError(f"Įrenginys nerastas: {name}")
+        device.set_param(attr, value)
+        return valdymas.device_record(device)
+    if op == "turn_on_all":
+        return _summary(valdymas.turn_on_all())
+    if op == "turn_off_all":
+        return _summary(valdymas.turn_off_all())
+    if op == "leavehome":
+        return _summary(valdymas.leavehome())
+    if op == "apply_scene":
+        return _summary(valdymas.apply_scene(Scene.from_dict(args)))
+    if op == "info":
+        return [device.device_info() for device in valdymas.devices]
+    if op == "records":
+        return [valdymas.device_record(device) for device in valdymas.devices]
+    if op == "count":
+        return len(valdymas)
+    if op == "save":
+        journal.compact()
+        return None
+    raise ValueError(f"Nežinoma komanda: {op}")
+
+
+def _worker(conn, snapshot, journal_file):
+    # Kiekvienas skaidinys - atskiras procesas su savo Valdymas ir failais
+    valdymas = Valdymas(DeviceFactory)
+    journal = Journal(journal_file, snapshot=snapshot, sync_every=0,
+                      sync_interval=1.0).open(valdymas)
+    while True:
+        op, args = conn.recv()
+        if op == "close":
+            journal.compact()
+            journal.close()
+            conn.send(("ok", None))
+            break
+        try:
+            conn.send(("ok", _handle(valdymas, journal, op, args)))
+        except Exception as error:
+            conn.send(("error", error))
+    conn.close()
+
+
+class ShardedValdymas:
+    # Koordinatorius: įrenginiai paskirstomi tarp shards procesų pagal
+    # pavadinimą (partition(name, shards) -> skaidinio numeris). Pavienės
+    # komandos siunčiamos skaidiniui savininkui, masinės - visiems iš karto
+    def __init__(self, shards=4, directory=".", partition=hash_partition):
+        self.shards = shards
+        self.partition = partition
+        self._connections = []
+        self._processes = []
+        for i in range(shards):
+            parent, child = multiprocessing.Pipe()
+            base = os.path.join(directory, f"shard-{i}")
+            process = multiprocessing.Process(
+                target=_worker, args=(child, base + ".json", base + ".journal"),
+                daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def _receive(self, conn):
+        status, result = conn.recv()
+        if status == "error":
+            raise result
+        return result
+
+    def _call(self, shard, op, args=None):
+        conn = self._connections[shard]
+        conn.send((op, args))
+        return self._receive(conn)
+
+    def _broadcast(self, op, args=None):
+        # Pirma išsiunčiama visiems, tik tada laukiama atsakymų, kad skaidiniai
+        # dirbtų lygiagrečiai
+        for conn in self._connections:
+            conn.send((op, args))
+        return [self._receive(conn) for conn in self._connections]
+
+    def shard_of(self, name):
+        return self.partition(name, self.shards)
+
+    def create_device(self, device_type, name, **params):
+        return self._call(self.shard_of(name), "create",
+                          (device_type, name, params))
+
+    def delete_device(self, name):
+        return self._call(self.shard_of(name), "delete", name)
+
+    def get_device(self, name):
+        return self._call(self.shard_of(name), "get", name)
+
+    def set_param(self, name, attr, value):
+        return self._call(self.shard_of(name), "set", (name, attr, value))
+
+    def _merged(self, op, args=None):
+        matched = changed = 0
+        by_type = {}
+        for result in self._broadcast(op, args):
+            matched += result.matched
+            changed += result.changed
+            for type_name, count in result.by_type.items():
+                by_type[type_name] = by_type.get(type_name, 0) + count
+        return BulkResult(matched, changed, by_type)
+
+    def turn_on_all(self):
+        return self._merged("turn_on_all")
+
+    def turn_off_all(self):
+        return self._merged("turn_off_all")
+
+    def leavehome(self):
+        return self._merged("leavehome")
+
+    def apply_scene(self, scene):
+        # Funkcijos į skaidinių procesus neperduodamos, o be selector scena
+        # būtų pritaikyta visiems įrenginiams
+        if callable(scene.selector):
+            raise ValueError(f"Scena {scene.name} su funkcija selector "
+                             "negali būti siunčiama skaidiniams")
+        return self._merged("apply_scene", scene.to_dict())
+
+    def device_info(self):
+        return [line for lines in self._broadcast("info") for line in lines]
+
+    def print_device_info(self):
+        for line in self.device_info():
+            print(line)
+
+    def records(self):
+        return [record for records in self._broadcast("records")
+                for record in records]
+
+    def __len__(self):
+        return sum(self._broadcast("count"))
+
+    def import_devices(self, records):
+        # Pvz. formats.get_format("json").load("devices.json")
+        for record in records:
+            params = {k: v for k, v in record.items()
+                      if k not in ("type", "name", "status")}
+            self.create_device(record["type"], record["name"], **params)
+            if record["status"]:
+                self.set_param(record["name"], "status", True)
+
+    def save(self):
+        self._broadcast("save")
+
+    def close(self):
+        if self._connections:
+            self._broadcast("close")
+            for conn in self._connections:
+                conn.close()
+            for process in self._processes:
+                process.join()
+            self._connections = []
+            self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
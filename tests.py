@@ -1,7 +1,34 @@
+import asyncio
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from datetime import datetime
 from unittest.mock import patch
+from urllib.parse import quote
 from io import StringIO
-from main import TV, Light, AirConditioner, Door, Camera, DeviceFactory, Valdymas
+from benchmarks import bench_suite, compare_to_baseline
+from async_control import AsyncValdymas, SimulatedTransport
+from metrics import Metrics, SamplingProfiler
+from history import HistoryStore
+from main import TV, Light, AirConditioner, Door, Camera, DeviceFactory, Valdymas, App
+import main
+from events import BufferedSink, CollectingSink, ConsoleSink, Event
+from formats import MappedSnapshot, binary_to_json, json_to_binary
+from persistence import Journal, iter_json_array
+from query import Between, NameStartsWith, StatusIs, TypeIs
+from rules import Rule, RulesEngine
+from scenes import Scene
+from schema import SCHEMAS, DeviceSchema, Field
+from scheduler import Scheduler, SimulatedClock
+from server import ValdymasServer, WriteCoalescer
+from sharding import ShardedValdymas
+from threadsafe import ThreadSafeValdymas
 
 
 class TestDeviceMethods(unittest.TestCase):
@@ -118,6 +145,1226 @@ class TestValdymasMethods(unittest.TestCase):
         self.assertFalse(light.is_on())
         self.assertTrue(door.get_status() == "Užrakinta")
 
+    # Testas, ar įrenginys randamas pagal pavadinimą ir tipą
+    def test_device_indexes(self):
+        tv = self.valdymas.create_device("TV", "Samsung TV", channel=1, volume=10)
+        light = self.valdymas.create_device("Light", "Living Room Light", brightness=50)
+        self.assertIs(self.valdymas.get_device("Samsung TV"), tv)
+        self.assertIsNone(self.valdymas.get_device("Nėra"))
+        self.assertEqual(self.valdymas.get_devices_by_type(Light), [light])
+        self.valdymas.delete_device(tv)
+        self.assertIsNone(self.valdymas.get_device("Samsung TV"))
+        self.assertEqual(self.valdymas.get_devices_by_type(TV), [])
+
+    # Testas, ar būsenos indeksas atnaujinamas keičiant įrenginio būseną
+    def test_status_index(self):
+        tv = self.valdymas.create_device("TV", "Samsung TV", channel=1, volume=10)
+        light = self.valdymas.create_device("Light", "Living Room Light", brightness=50)
+        self.assertEqual(self.valdymas.get_devices_by_status(True), [])
+        light.turn_on()
+        self.assertEqual(self.valdymas.get_devices_by_status(True), [light])
+        self.assertEqual(self.valdymas.get_devices_by_status(False), [tv])
+
+    # Testas, ar masinė operacija grąžina santrauką ir praleidžia nepakitusius
+    def test_apply_changes_summary(self):
+        lights = [self.valdymas.create_device("Light", f"Light {i}", brightness=50)
+                  for i in range(3)]
+        ac = self.valdymas.create_device("AirConditioner", "Bedroom AC", temperature=22)
+        lights[0].set_brightness(80)
+        result = self.valdymas.apply_changes({
+            Light: {"brightness": 80, "status": True},
+            AirConditioner: {"temperature": 40},
+        })
+        self.assertEqual(result.matched, 4)
+        self.assertEqual(result.changed, 5)
+        self.assertEqual(result.by_type, {"Light": 5})
+        self.assertEqual(ac.get_temperature(), 22)
+        self.assertTrue(all(light.is_on() for light in lights))
+
+    # Testas, ar masinė operacija taikoma tik atrinktiems įrenginiams
+    def test_apply_changes_where(self):
+        lights = [self.valdymas.create_device("Light", f"Light {i}", brightness=i * 30)
+                  for i in range(4)]
+        result = self.valdymas.apply_changes(
+            {Light: {"status": True}}, where=lambda d: d.get_brightness() > 30)
+        self.assertEqual(result.changed, 2)
+        self.assertEqual(self.valdymas.get_devices_by_status(True), lights[2:])
+
+    # Testas, ar 'Išėjau iš namų' nekeičia jau tinkamos būsenos įrenginių
+    def test_leave_home_summary(self):
+        self.valdymas.create_device("Door", "Front Door", locked=True)
+        self.valdymas.create_device("Camera", "Kamera", resolution="4K")
+        self.valdymas.create_device("Light", "Living Room Light", brightness=50)
+        report = self.valdymas.leavehome()
+        self.assertEqual(report.by_type, {"Camera": 1})
+
+    # Testas, ar versijos leidžia gauti tik pasikeitusius įrenginius
+    def test_changes_since(self):
+        tv = self.valdymas.create_device("TV", "Samsung TV", channel=1, volume=10)
+        light = self.valdymas.create_device("Light", "Living Room Light", brightness=50)
+        door = self.valdymas.create_device("Door", "Front Door", locked=False)
+        version = self.valdymas.version
+        light.set_brightness(75)
+        tv.set_channel(1)
+        self.valdymas.delete_device(door)
+        changes = self.valdymas.changes_since(version)
+        self.assertEqual(changes.changed, [light])
+        self.assertEqual(changes.deleted, ["Front Door"])
+        self.assertEqual(light.get_version(), version + 1)
+        self.assertEqual(self.valdymas.changes_since(changes.version).changed, [])
+        self.valdymas.forget_changes(changes.version)
+        self.assertEqual(self.valdymas.changes_since(version).deleted, [])
+        self.assertEqual(self.valdymas.forgotten_version, changes.version)
+
+    # Testas, ar ištrynus įrenginį išlieka eiliškumas
+    def test_delete_keeps_order(self):
+        devices = [self.valdymas.create_device("Light", f"Light {i}", brightness=i)
+                   for i in range(5)]
+        self.valdymas.delete_device(devices[2])
+        self.assertEqual(self.valdymas.devices, devices[:2] + devices[3:])
+
+
+class TestEventSinks(unittest.TestCase):
+    def setUp(self):
+        self.device_factory = DeviceFactory()
+
+    # Testas, ar be įvykių gavėjo masinės operacijos nieko nespausdina
+    def test_no_sink_is_silent(self):
+        valdymas = Valdymas(self.device_factory)
+        valdymas.create_device("Light", "Living Room Light", brightness=50)
+        with patch("sys.stdout", new_callable=StringIO) as mock_stdout:
+            valdymas.turn_on_all()
+            valdymas.leavehome()
+            self.assertEqual(mock_stdout.getvalue(), "")
+
+    # Testas, ar konsolės gavėjas spausdina tuos pačius pranešimus
+    def test_console_sink_messages(self):
+        stream = StringIO()
+        valdymas = Valdymas(self.device_factory, sink=ConsoleSink(stream))
+        ac = valdymas.create_device("AirConditioner", "Bedroom AC", temperature=22)
+        ac.turn_on()
+        ac.set_temperature(40)
+        ac.set_temperature(18)
+        self.assertEqual(stream.getvalue().splitlines(), [
+            "Bedroom AC įrenginys pridėtas.",
+            "Bedroom AC įjungtas.",
+            "Tokia temperatūra negalima",
+            "Bedroom AC nustatyta temperatūra: 18°C.",
+        ])
+
+    # Testas, ar struktūrizuoti įvykiai surenkami
+    def test_collecting_sink(self):
+        sink = CollectingSink()
+        valdymas = Valdymas(self.device_factory, sink=sink)
+        light = valdymas.create_device("Light", "Living Room Light", brightness=50)
+        light.set_brightness(75)
+        self.assertEqual([(e.kind, e.old, e.new) for e in sink.events],
+                         [("added", None, None), ("brightness", 50, 75)])
+        self.assertIs(sink.events[1].device, light)
+
+    # Testas, ar buferinis gavėjas rašo paketais
+    def test_buffered_sink(self):
+        stream = StringIO()
+        valdymas = Valdymas(self.device_factory,
+                            sink=BufferedSink(stream, batch_size=3))
+        valdymas.create_device("Light", "Light 1", brightness=50)
+        valdymas.create_device("Light", "Light 2", brightness=50)
+        self.assertEqual(stream.getvalue(), "")
+        valdymas.turn_on_all()
+        self.assertEqual(len(stream.getvalue().splitlines()), 3)
+        valdymas.sink.flush()
+        self.assertEqual(len(stream.getvalue().splitlines()), 4)
+
+
+class TestPersistence(unittest.TestCase):
+    def setUp(self):
+        self.device_factory = DeviceFactory()
+        self.valdymas = Valdymas(self.device_factory)
+        handle, self.filename = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self.addCleanup(os.remove, self.filename)
+
+    def _fill(self):
+        self.valdymas.create_device("TV", "Samsung TV", channel=1, volume=10)
+        self.valdymas.create_device("Light", "Šviesa", brightness=50).turn_on()
+        self.valdymas.create_device("Door", "Front Door", locked=True)
+        self.valdymas.create_device("Camera", "Kamera", resolution="4K")
+        self.valdymas.save_devices_to_file(self.filename)
+
+    # Testas, ar JSON masyvas skaitomas po vieną elementą net mažais gabalais
+    def test_iter_json_array_small_chunks(self):
+        self._fill()
+        with open(self.filename, "rb") as f:
+            items = [item for _, _, item in iter_json_array(f, chunk_size=3)]
+        self.assertEqual([item["name"] for item in items],
+                         ["Samsung TV", "Šviesa", "Front Door", "Kamera"])
+
+    # Testas, ar įrenginiai atkuriami iš failo
+    def test_load_devices_from_file(self):
+        self._fill()
+        loaded = Valdymas(self.device_factory)
+        loaded.load_devices_from_file(self.filename)
+        self.assertEqual([d.device_info() for d in loaded.devices],
+                         [d.device_info() for d in self.valdymas.devices])
+        self.assertEqual(loaded.get_devices_by_status(True),
+                         [loaded.get_device("Šviesa")])
+
+    # Testas, ar tingus režimas sukuria įrenginį tik jį pasiekus
+    def test_lazy_load(self):
+        self._fill()
+        loaded = Valdymas(self.device_factory)
+        with loaded.load_devices_from_file(self.filename, lazy=True) as lazy:
+            self.assertEqual(len(lazy), 4)
+            self.assertEqual(len(loaded.devices), 0)
+            door = lazy[2]
+            self.assertEqual(door.get_status(), "Užrakinta")
+            self.assertIs(lazy[2], door)
+            self.assertEqual(lazy.materialized(), 1)
+            self.assertEqual(loaded.devices, [door])
+
+    def _journal(self, valdymas, **kwargs):
+        return Journal(self.filename + ".journal", snapshot=self.filename,
+                       **kwargs).open(valdymas)
+
+    # Testas, ar pakeitimai atkuriami iš žurnalo be pilno išsaugojimo
+    def test_journal_replay(self):
+        self._fill()
+        self.addCleanup(os.remove, self.filename + ".journal")
+        valdymas = Valdymas(self.device_factory)
+        journal = self._journal(valdymas, sync_every=2)
+        valdymas.create_device("AirConditioner", "Bedroom AC", temperature=22)
+        valdymas.get_device("Samsung TV").set_channel(7)
+        valdymas.delete_device(valdymas.get_device("Front Door"))
+        valdymas.get_device("Šviesa").turn_off()
+        journal.close()
+
+        restored = Valdymas(self.device_factory)
+        self._journal(restored).close()
+        self.assertEqual([d.device_info() for d in restored.devices],
+                         [d.device_info() for d in valdymas.devices])
+
+    # Testas, ar pavadinimai unikalūs, kad žurnalo įrašai rodytų į vieną įrenginį
+    def test_journal_names_are_unique(self):
+        self._fill()
+        self.addCleanup(os.remove, self.filename + ".journal")
+        valdymas = Valdymas(self.device_factory)
+        journal = self._journal(valdymas)
+        with self.assertRaises(ValueError):
+            valdymas.create_device("Light", "Šviesa", brightness=10)
+        valdymas.create_device("Light", "Šviesa 2", brightness=10).set_brightness(70)
+        journal.checkpoint()
+        journal.close()
+
+        restored = Valdymas(self.device_factory)
+        self._journal(restored).close()
+        self.assertEqual([d.device_info() for d in restored.devices],
+                         [d.device_info() for d in valdymas.devices])
+
+    # Testas, ar seno failo pasikartojantys pavadinimai pervadinami vienodai
+    # kiekvieną kartą, kad žurnalas po lūžio pakeistų tą patį įrenginį
+    def test_duplicate_names_in_snapshot(self):
+        self.addCleanup(os.remove, self.filename + ".journal")
+        with open(self.filename, "w", encoding="utf-8") as f:
+            json.dump([{"type": "Light", "name": "Lempa", "status": False, "brightness": 10},
+                       {"type": "Light", "name": "Lempa", "status": False, "brightness": 20}], f)
+        sink = CollectingSink()
+        valdymas = Valdymas(self.device_factory, sink=sink)
+        journal = self._journal(valdymas)
+        self.assertEqual([event.kind for event in sink.events], ["renamed"])
+        valdymas.get_device("Lempa (2)").set_brightness(90)
+        # Lūžis: žurnalas neuždarytas ir nesuspaustas
+        journal._file.close()
+
+        restored = Valdymas(self.device_factory)
+        self._journal(restored).close()
+        self.assertEqual([(d.get_name(), d.get_brightness()) for d in restored.devices],
+                         [("Lempa", 10), ("Lempa (2)", 90)])
+
+    # Testas, ar po checkpoint() ištrintas ir iš naujo sukurtas to paties
+    # pavadinimo įrenginys atkuriamas kaip vienas, naujas įrenginys
+    def test_journal_add_after_delete(self):
+        self._fill()
+        self.addCleanup(os.remove, self.filename + ".journal")
+        valdymas = Valdymas(self.device_factory)
+        journal = self._journal(valdymas)
+        valdymas.get_device("Šviesa").set_brightness(80)
+        journal.checkpoint()
+        valdymas.delete_device(valdymas.get_device("Šviesa"))
+        valdymas.create_device("Light", "Šviesa", brightness=5)
+        valdymas.create_device("Light", "Kita", brightness=6)
+        journal.checkpoint()
+        journal.close()
+
+        restored = Valdymas(self.device_factory)
+        self._journal(restored).close()
+        self.assertEqual(sorted(d.device_info() for d in restored.devices),
+                         sorted(d.device_info() for d in valdymas.devices))
+
+    # Testas, ar checkpoint() įrašo tik pasikeitusius įrenginius
+    def test_journal_checkpoint(self):
+        self._fill()
+        self.addCleanup(os.remove, self.filename + ".journal")
+        valdymas = Valdymas(self.device_factory)
+        journal = self._journal(valdymas, per_change=False)
+        for brightness in (10, 20, 30):
+            valdymas.get_device("Šviesa").set_brightness(brightness)
+        valdymas.delete_device(valdymas.get_device("Front Door"))
+        self.assertEqual(journal.checkpoint(), 2)
+        # Įrašyti ištrintieji nebelaikomi atmintyje
+        self.assertEqual(valdymas.changes_since(0).deleted, [])
+        self.assertEqual(journal.checkpoint(), 0)
+        journal.close()
+
+        restored = Valdymas(self.device_factory)
+        self._journal(restored).close()
+        self.assertEqual([d.device_info() for d in restored.devices],
+                         [d.device_info() for d in valdymas.devices])
+
+    # Testas, ar suspaudimas įrašo būseną į failą ir išvalo žurnalą; riba ne
+    # mažesnė už įrenginių skaičių (čia 4)
+    def test_journal_compact(self):
+        self._fill()
+        self.addCleanup(os.remove, self.filename + ".journal")
+        valdymas = Valdymas(self.device_factory)
+        journal = self._journal(valdymas, compact_every=3)
+        for brightness in (10, 20, 30, 40, 50):
+            valdymas.get_device("Šviesa").set_brightness(brightness)
+        with open(self.filename + ".journal") as f:
+            self.assertEqual(len(f.readlines()), 1)
+        journal.close()
+
+        restored = Valdymas(self.device_factory)
+        restored.load_devices_from_file(self.filename)
+        self.assertEqual(restored.get_device("Šviesa").get_brightness(), 40)
+
+    # Testas, ar masinė operacija daro vieną fsync, o ne po vieną įrenginiui
+    def test_journal_bulk_syncs_once(self):
+        self._fill()
+        self.addCleanup(os.remove, self.filename + ".journal")
+        valdymas = Valdymas(self.device_factory)
+        journal = self._journal(valdymas, compact_every=1000)
+        for i in range(20):
+            valdymas.create_device("Light", f"Šviesa {i}", brightness=i)
+        with patch("persistence.os.fsync") as fsync:
+            self.assertEqual(valdymas.turn_on_all().changed, 23)
+            valdymas.leavehome()
+        self.assertEqual(fsync.call_count, 2)
+        journal.close()
+
+        restored = Valdymas(self.device_factory)
+        self._journal(restored).close()
+        self.assertFalse(any(light.is_on() for light in restored.get_devices_by_type(Light)))
+
+
+class TestFormats(unittest.TestCase):
+    def setUp(self):
+        self.device_factory = DeviceFactory()
+        self.valdymas = Valdymas(self.device_factory)
+        self.valdymas.create_device("TV", "Samsung TV", channel=1, volume=10)
+        self.valdymas.create_device("Light", "Šviesa", brightness=50).turn_on()
+        self.valdymas.create_device("AirConditioner", "Bedroom AC", temperature=-3)
+        self.valdymas.create_device("Door", "Front Door", locked=True)
+        self.valdymas.create_device("Camera", "Kamera", resolution="4K")
+        self.valdymas.create_device("Light", "Virtuvė", brightness=80)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    # Testas, ar dvejetainis formatas išsaugo ir atkuria tą pačią būseną
+    def test_binary_round_trip(self):
+        self.valdymas.save_devices_to_file(self._path("devices.bin"), format="binary")
+        loaded = Valdymas(self.device_factory)
+        loaded.load_devices_from_file(self._path("devices.bin"), format="binary")
+        self.assertEqual([d.device_info() for d in loaded.devices],
+                         [d.device_info() for d in self.valdymas.devices])
+
+    # Testas, ar mmap skaitytuvas randa įrenginį nenuskaitęs viso failo
+    def test_mapped_snapshot_lookup(self):
+        self.valdymas.save_devices_to_file(self._path("devices.bin"), format="binary")
+        with MappedSnapshot(self._path("devices.bin")) as snapshot:
+            self.assertEqual(len(snapshot), 6)
+            self.assertTrue(snapshot.status("Šviesa"))
+            self.assertFalse(snapshot.status("Virtuvė"))
+            self.assertIsNone(snapshot.status("Nėra"))
+            self.assertEqual(snapshot.get("Kamera")["resolution"], "4K")
+            self.assertEqual(snapshot.get("Bedroom AC")["temperature"], -3)
+
+    # Testas, ar konvertavimas JSON -> dvejetainis -> JSON nieko nepraranda
+    def test_convert_json_binary(self):
+        self.valdymas.save_devices_to_file(self._path("devices.json"))
+        json_to_binary(self._path("devices.json"), self._path("devices.bin"))
+        binary_to_json(self._path("devices.bin"), self._path("copy.json"))
+        with open(self._path("devices.json")) as a, open(self._path("copy.json")) as b:
+            self.assertEqual(a.read(), b.read())
+
+
+class TestScenes(unittest.TestCase):
+    def setUp(self):
+        self.sink = CollectingSink()
+        self.valdymas = Valdymas(DeviceFactory(), sink=self.sink)
+        self.tv = self.valdymas.create_device("TV", "1 aukštas TV", channel=1, volume=10)
+        self.light = self.valdymas.create_device("Light", "1 aukštas šviesa", brightness=50)
+        self.upstairs = self.valdymas.create_device("Light", "2 aukštas šviesa", brightness=50)
+        self.door = self.valdymas.create_device("Door", "Front Door", locked=False)
+
+    # Testas, ar scena keičia tik atrinktus įrenginius ir praneša pakeitimus
+    def test_scene_with_selector(self):
+        self.valdymas.turn_on_all()
+        night = Scene("naktis", {"Light": {"status": False, "brightness": 10}},
+                      selector={"name_prefix": "1 aukštas"})
+        report = self.valdymas.apply_scene(night)
+        self.assertEqual(report.matched, 1)
+        self.assertEqual([(d, attr) for d, attr, _, _ in report.changes],
+                         [(self.light, "status"), (self.light, "brightness")])
+        self.assertTrue(self.upstairs.is_on())
+
+    # Testas, ar jau tinkamos būsenos įrenginiai nesukelia įvykių
+    def test_scene_skips_devices_in_target_state(self):
+        self.valdymas.leavehome()
+        del self.sink.events[:]
+        report = self.valdymas.leavehome()
+        self.assertEqual(report.changes, [])
+        self.assertEqual([e.kind for e in self.sink.events], ["leavehome"])
+
+    # Testas, ar planas perskaičiuojamas pridėjus įrenginį
+    def test_scene_plan_follows_new_devices(self):
+        report = self.valdymas.leavehome()
+        self.assertEqual(report.by_type, {"Door": 1})
+        camera = self.valdymas.create_device("Camera", "Kamera", resolution="4K")
+        report = self.valdymas.leavehome()
+        self.assertEqual(report.by_type, {"Camera": 1})
+        self.assertTrue(camera.is_on())
+
+
+class TestAsyncControl(unittest.TestCase):
+    def setUp(self):
+        self.valdymas = Valdymas(DeviceFactory())
+        self.lights = [self.valdymas.create_device("Light", f"Light {i}", brightness=50)
+                       for i in range(20)]
+        self.door = self.valdymas.create_device("Door", "Front Door", locked=False)
+
+    # Testas, ar komandos siunčiamos lygiagrečiai ir pritaikomos būsenai
+    def test_concurrent_turn_on_all(self):
+        transport = SimulatedTransport(latency=0.05)
+        controller = AsyncValdymas(self.valdymas, transport, concurrency=50)
+        start = time.perf_counter()
+        results = asyncio.run(controller.turn_on_all())
+        self.assertLess(time.perf_counter() - start, 0.05 * 5)
+        self.assertEqual(len(results), 21)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(len(self.valdymas.get_devices_by_status(True)), 21)
+
+    # Testas, ar nepavykusios komandos nekeičia būsenos ir yra pranešamos
+    def test_failures_and_timeouts(self):
+        transport = SimulatedTransport(latency=0.01, failing=["Light 3"])
+        controller = AsyncValdymas(self.valdymas, transport)
+        results = asyncio.run(controller.leavehome())
+        self.assertEqual([(r.device, r.ok) for r in results], [(self.door, True)])
+        self.assertEqual(self.door.get_status(), "Užrakinta")
+
+        result = asyncio.run(controller.device("Light 3").turn_on())
+        self.assertFalse(result.ok)
+        self.assertIn("neatsako", result.error)
+        self.assertFalse(self.lights[3].is_on())
+
+        slow = AsyncValdymas(self.valdymas, SimulatedTransport(latency=1), timeout=0.02)
+        results = asyncio.run(slow.apply_changes({Light: {"brightness": 90}}))
+        self.assertEqual({r.error for r in results}, {"timeout"})
+        self.assertEqual(self.lights[0].get_brightness(), 50)
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.valdymas = Valdymas(DeviceFactory())
+        self.lights = [self.valdymas.create_device("Light", f"Šviesa {i}", brightness=i * 10)
+                       for i in range(10)]
+        self.tv = self.valdymas.create_device("TV", "Samsung TV", channel=1, volume=30)
+        self.ac = self.valdymas.create_device("AirConditioner", "Bedroom AC", temperature=22)
+        for light in self.lights[::2]:
+            light.turn_on()
+
+    def _names(self, query):
+        return sorted(device.get_name() for device in self.valdymas.query(query))
+
+    # Testas, ar sąlygos jungiamos per & ir |
+    def test_combined_query(self):
+        query = TypeIs(Light) & StatusIs(True) & Between("brightness", low=50)
+        self.assertEqual(self._names(query), ["Šviesa 6", "Šviesa 8"])
+        query = Between("volume", 20, 40) | Between("temperature", high=20)
+        self.assertEqual(self._names(query), ["Samsung TV"])
+
+    # Testas, ar indeksai atnaujinami pasikeitus parametrams
+    def test_range_index_follows_changes(self):
+        self.lights[0].set_brightness(95)
+        self.ac.set_temperature(18)
+        self.valdymas.delete_device(self.lights[9])
+        self.assertEqual(self._names(Between("brightness", 85)), ["Šviesa 0"])
+        self.assertEqual(self._names(Between("temperature", high=20)), ["Bedroom AC"])
+
+    # Testas, ar paieška pagal pavadinimo pradžią veikia po pridėjimų ir trynimų
+    def test_name_prefix(self):
+        self.assertEqual(len(self._names(NameStartsWith("Šviesa"))), 10)
+        self.valdymas.delete_device(self.lights[1])
+        self.valdymas.create_device("Light", "Šviesa 10", brightness=5)
+        self.assertEqual(self._names(NameStartsWith("Šviesa 1")), ["Šviesa 10"])
+        self.assertEqual(self._names(NameStartsWith("Samsung") & StatusIs(True)), [])
+
+    # Testas, ar užklausa grąžina tingų iteratorių
+    def test_query_is_lazy(self):
+        result = self.valdymas.query(TypeIs(Light) & StatusIs(True))
+        self.assertFalse(isinstance(result, list))
+        for light in result:
+            light.turn_off()
+        self.assertEqual(self.valdymas.get_devices_by_status(True), [])
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    # Testas, ar masinės komandos paskirstomos ir rezultatai sujungiami
+    def test_sharded_bulk_operations(self):
+        with ShardedValdymas(shards=2, directory=self.tmpdir.name) as sharded:
+            for i in range(6):
+                sharded.create_device("Light", f"Šviesa {i}", brightness=50)
+            sharded.create_device("Door", "Front Door", locked=False)
+            self.assertEqual(len(sharded), 7)
+            self.assertEqual(sharded.turn_on_all().changed, 7)
+            self.assertEqual(sharded.leavehome().by_type, {"Light": 6, "Door": 1})
+            self.assertEqual(len(sharded.device_info()), 7)
+            self.assertEqual(sharded.get_device("Front Door")["locked"], True)
+            with self.assertRaises(ValueError):
+                sharded.set_param("Nėra", "status", True)
+
+    # Testas, ar scena su funkcija selector atmetama, o ne taikoma visiems
+    def test_sharded_scene_selectors(self):
+        with ShardedValdymas(shards=2, directory=self.tmpdir.name) as sharded:
+            for name in ("front", "back"):
+                sharded.create_device("Door", name, locked=True)
+            scene = Scene("unlock_front", {"Door": {"locked": False}},
+                          selector=lambda device: device.get_name() == "front")
+            with self.assertRaises(ValueError):
+                sharded.apply_scene(scene)
+            self.assertEqual(sharded.get_device("back")["locked"], True)
+            result = sharded.apply_scene(Scene("unlock_front", {"Door": {"locked": False}},
+                                               selector={"names": ["front"]}))
+            self.assertEqual((result.matched, result.changed), (1, 1))
+            self.assertEqual(sharded.get_device("front")["locked"], False)
+            self.assertEqual(sharded.get_device("back")["locked"], True)
+
+    # Testas, ar kiekvienas skaidinys išsaugo savo įrenginius
+    def test_shards_persist_their_devices(self):
+        with ShardedValdymas(shards=2, directory=self.tmpdir.name) as sharded:
+            for i in range(6):
+                sharded.create_device("Light", f"Šviesa {i}", brightness=i)
+            sharded.set_param("Šviesa 3", "brightness", 99)
+            sharded.delete_device("Šviesa 0")
+        files = sorted(f for f in os.listdir(self.tmpdir.name) if f.endswith(".json"))
+        self.assertEqual(files, ["shard-0.json", "shard-1.json"])
+        with ShardedValdymas(shards=2, directory=self.tmpdir.name) as sharded:
+            self.assertEqual(len(sharded), 5)
+            self.assertEqual(sharded.get_device("Šviesa 3")["brightness"], 99)
+            self.assertIsNone(sharded.get_device("Šviesa 0"))
+
+
+class TestThreadSafeValdymas(unittest.TestCase):
+    # Testas, ar indeksai lieka teisingi keičiant įrenginius iš kelių gijų
+    def test_concurrent_changes_keep_indexes_consistent(self):
+        valdymas = ThreadSafeValdymas(DeviceFactory())
+        lights = [valdymas.create_device("Light", f"Šviesa {i}", brightness=0)
+                  for i in range(100)]
+        snapshots = []
+
+        def change(seed):
+            for i in range(2000):
+                light = lights[(seed * 31 + i * 7) % len(lights)]
+                light.set_brightness((seed + i) % 10)
+                light.set_power(i % 3 == 0)
+
+        errors = []
+
+        def add_and_delete():
+            # Kiti tipai, kad _by_type raktai būtų pridedami ir šalinami
+            for i in range(300):
+                if i % 2:
+                    device = valdymas.create_device("Door", f"Laikina {i}")
+                else:
+                    device = valdymas.create_device("Camera", f"Laikina {i}", resolution="HD")
+                valdymas.delete_device(device)
+
+        def bulk():
+            try:
+                for i in range(20):
+                    if i % 2:
+                        valdymas.turn_off_all()
+                    else:
+                        valdymas.turn_on_all()
+                    snapshots.append(valdymas.snapshot())
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=change, args=(seed,)) for seed in range(4)]
+        threads += [threading.Thread(target=add_and_delete), threading.Thread(target=bulk)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(valdymas), 100)
+        for light in lights:
+            self.assertIn(light, valdymas.status_index(light.is_on()))
+            bucket = valdymas.value_index("brightness").range(
+                light.get_brightness(), light.get_brightness())
+            self.assertIn(light, list(bucket))
+        self.assertEqual(len(valdymas.status_index(True)) + len(valdymas.status_index(False)), 100)
+        self.assertEqual(valdymas.value_index("brightness").count(), 100)
+        self.assertTrue(all(len(s.records) in (100, 101) for s in snapshots))
+
+
+    # Testas, ar paieška pagal pavadinimą kitose gijose neprarada naujų pavadinimų
+    def test_concurrent_name_queries(self):
+        valdymas = ThreadSafeValdymas(DeviceFactory())
+        done = threading.Event()
+        errors = []
+
+        def create(seed):
+            for i in range(1500):
+                valdymas.create_device("Light", f"Šviesa {seed}-{i}", brightness=1)
+
+        def search():
+            try:
+                while not done.is_set():
+                    list(valdymas.query(NameStartsWith("Šviesa 1")))
+            except Exception as error:
+                errors.append(error)
+
+        # Dažnas gijų perjungimas, kad lenktynės pasireikštų
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        creators = [threading.Thread(target=create, args=(seed,)) for seed in range(3)]
+        searchers = [threading.Thread(target=search) for _ in range(4)]
+        for thread in creators + searchers:
+            thread.start()
+        for thread in creators:
+            thread.join()
+        done.set()
+        for thread in searchers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(list(valdymas.query(NameStartsWith("Šviesa ")))), 4500)
+        self.assertEqual(NameStartsWith("Šviesa 2-").estimate(valdymas), 1500)
+
+        # Nauji pavadinimai sujungiami tik laikant Valdymas užraktą
+        valdymas.create_device("Light", "Šviesa naujas", brightness=1)
+        with valdymas._lock:
+            search = threading.Thread(
+                target=lambda: list(valdymas.query(NameStartsWith("Šviesa n"))))
+            search.start()
+            search.join(0.05)
+            self.assertTrue(search.is_alive())
+        search.join()
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.valdymas = ThreadSafeValdymas(DeviceFactory())
+        self.valdymas.create_device("Light", "Virtuvė", brightness=40)
+        self.server = ValdymasServer(self.valdymas, port=0).start()
+        self.conn = http.client.HTTPConnection(*self.server.address)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.close()
+
+    def request(self, method, path, data=None):
+        body = None if data is None else json.dumps(data)
+        self.conn.request(method, quote(path, safe="/?=&"), body)
+        response = self.conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    # Testas, ar REST keliai kuria, keičia ir trina įrenginius per tą pačią jungtį
+    def test_device_crud(self):
+        status, record = self.request("POST", "/devices",
+                                      {"type": "TV", "name": "Salonas", "channel": 1, "volume": 5})
+        self.assertEqual(status, 200)
+        self.assertEqual(record["channel"], 1)
+        status, record = self.request("PATCH", "/devices/Salonas", {"channel": 7, "status": True})
+        self.assertEqual((status, record["channel"], record["status"]), (200, 7, True))
+        status, records = self.request("GET", "/devices?type=TV&status=true")
+        self.assertEqual([r["name"] for r in records], ["Salonas"])
+        self.assertEqual(self.request("DELETE", "/devices/Salonas")[0], 200)
+        self.assertEqual(self.request("GET", "/devices/Salonas")[0], 404)
+        self.assertEqual(self.request("PATCH", "/devices/Virtuvė", {"spalva": 1})[0], 400)
+
+    # Testas, ar paketinė užklausa grąžina rezultatą kiekvienai komandai
+    def test_rpc_batch(self):
+        status, results = self.request("POST", "/rpc", [
+            {"op": "set", "name": "Virtuvė", "params": {"brightness": 80}},
+            {"op": "turn_on_all"},
+            {"op": "get", "name": "Nėra"},
+            {"op": "skristi"},
+            {"op": "query", "attr": "brightness", "low": 50},
+            "x",
+            [1],
+        ])
+        self.assertEqual(status, 200)
+        self.assertEqual([("error" in r) for r in results[5:]], [True, True])
+        self.assertEqual(results[0]["ok"]["brightness"], 80)
+        self.assertEqual(results[1]["ok"]["changed"], 1)
+        self.assertIsNone(results[2]["ok"])
+        self.assertIn("error", results[3])
+        self.assertEqual([r["name"] for r in results[4]["ok"]], ["Virtuvė"])
+        for body in ("x", 1):
+            self.assertEqual(self.request("POST", "/rpc", body)[0], 400)
+        status, results = self.request("POST", "/rpc", [
+            {"op": "apply_scene", "scene": 5},
+            {"op": "apply_scene", "scene": [1]},
+            {"op": "apply_scene", "scene": {"name": "s", "targets": [1]}},
+            {"op": "apply_scene", "scene": {"name": "s", "targets": {"Light": 1}}},
+            {"op": "apply_scene", "scene": {"name": "s", "targets": {}, "selector": [1]}},
+            {"op": "apply_scene", "scene": {"name": "s", "targets": {"Light": {"status": True}},
+                                            "selector": {"names": ["Virtuvė"]}}},
+        ])
+        self.assertEqual(status, 200)
+        self.assertEqual([("error" in r) for r in results], [True] * 5 + [False])
+        self.assertEqual(self.request("POST", "/rpc", {"op": "count"}), (200, {"ok": 1}))
+        self.assertEqual(self.request("POST", "/devices", [1])[0], 400)
+        self.assertEqual(self.request("PATCH", "/devices/Virtuvė", "x")[0], 400)
+
+    # Testas, ar vienu metu atėję to paties įrenginio pakeitimai taikomi vieną kartą
+    def test_concurrent_writes_are_coalesced(self):
+        coalescer = WriteCoalescer(self.valdymas)
+        events = []
+        self.valdymas.subscribe(events.append)
+        results = []
+        lock = coalescer._flush_lock("Virtuvė")
+        with lock:
+            threads = [threading.Thread(target=lambda v=value: results.append(
+                           coalescer.set("Virtuvė", {"brightness": v})))
+                       for value in (10, 20, 30)]
+            threads[0].start()
+            while "Virtuvė" not in coalescer._pending:
+                time.sleep(0.001)
+            for thread in threads[1:]:
+                thread.start()
+            while coalescer._pending["Virtuvė"].writers < 3:
+                time.sleep(0.001)
+        for thread in threads:
+            thread.join()
+        self.assertEqual((coalescer.requests, coalescer.flushes), (3, 1))
+        self.assertEqual(len(events), 1)
+        self.assertEqual([r["brightness"] for r in results], [30, 30, 30])
+
+
+class TestBenchmarks(unittest.TestCase):
+    # Testas, ar matavimų rinkinys veikia ir sulėtėjimai randami pagal bazinį failą
+    def test_suite_and_baseline(self):
+        results = bench_suite(sizes=(20,), repeat=1)
+        self.assertIn("turn_on_all[20]", results)
+        self.assertIn("load.binary[20]", results)
+        self.assertIn("print_device_info.cold[20]", results)
+        baseline = {"turn_on_all[20]": results["turn_on_all[20]"] / 3,
+                    "leavehome[20]": results["leavehome[20]"] * 3,
+                    "nebėra[20]": 1.0}
+        regressions = compare_to_baseline(results, baseline, tolerance=0.5)
+        self.assertEqual([name for name, _, _ in regressions], ["turn_on_all[20]"])
+
+
+class TestMetrics(unittest.TestCase):
+    # Testas, ar prijungtos metrikos skaičiuoja operacijas, o atjungus viskas atstatoma
+    def test_attach_counts_and_detach(self):
+        valdymas = Valdymas(DeviceFactory, sink=CollectingSink())
+        metrics = Metrics().attach(valdymas)
+        valdymas.create_device("Light", "Virtuvė", brightness=10)
+        valdymas.create_device("TV", "Salonas", channel=1, volume=5)
+        valdymas.turn_on_all()
+        valdymas.leavehome()
+        self.assertEqual(metrics.counter("device_changes_total",
+                                         (("type", "Light"), ("attr", "status"))), 2)
+        self.assertEqual(metrics.histogram("valdymas_operation_seconds",
+                                           (("op", "create_device"),)).count, 2)
+        self.assertEqual(metrics.histogram("factory_create_seconds",
+                                           (("type", "TV"),)).count, 1)
+        text = metrics.render_prometheus()
+        self.assertIn('valdymas_operation_seconds_count{op="leavehome"} 1', text)
+        self.assertIn('# TYPE device_changes_total counter', text)
+        self.assertIn("µs", metrics.render_text())
+
+        metrics.detach()
+        self.assertNotIn("turn_on_all", vars(valdymas))
+        self.assertIs(valdymas._device_factory, DeviceFactory)
+        self.assertIsInstance(valdymas.sink, CollectingSink)
+        valdymas.turn_off_all()
+        self.assertEqual(metrics.counter("device_changes_total",
+                                         (("type", "TV"), ("attr", "status"))), 2)
+
+    # Testas, ar profiliuotojas renka stekus tik profiliuojamų operacijų metu
+    def test_sampling_profiler(self):
+        class Slow:
+            def work(self):
+                time.sleep(0.05)
+
+            def other(self):
+                time.sleep(0.02)
+
+        slow = Slow()
+        metrics = Metrics()
+        metrics.profiler = SamplingProfiler(interval=0.001)
+        metrics.instrument(slow, ("work", "other"), "slow_seconds", profile=("work",))
+        slow.other()
+        self.assertEqual(metrics.profiler.samples, 0)
+        slow.work()
+        self.assertGreater(metrics.profiler.samples, 0)
+        self.assertIn("test_sampling_profiler", metrics.profiler.collapsed())
+        self.assertTrue(metrics.profiler.top(1)[0][0].endswith(":work"))
+
+
+class TestRules(unittest.TestCase):
+    def setUp(self):
+        self.sink = CollectingSink()
+        self.valdymas = Valdymas(DeviceFactory, sink=self.sink)
+        self.door = self.valdymas.create_device("Door", "Lauko durys", locked=True)
+        self.light = self.valdymas.create_device("Light", "Koridorius", brightness=50)
+        self.ac = self.valdymas.create_device("AirConditioner", "Salonas", temperature=22)
+        self.now = 0.0
+        self.engine = RulesEngine(self.valdymas, clock=lambda: self.now)
+
+    # Testas, ar atrakinus duris įsijungia šviesa, o kitos taisyklės nevykdomos
+    def test_rule_fires_on_matching_change(self):
+        self.engine.add(Rule.from_dict({
+            "name": "šviesa",
+            "when": {"device": "Lauko durys", "attr": "locked", "equals": False},
+            "then": {"device": "Koridorius", "set": {"status": True}}}))
+        self.engine.add(Rule("karšta", "temperature", {"scene": "leavehome"},
+                             device_type="AirConditioner", condition={"above": 26}))
+        self.assertEqual(len(self.engine.matching(
+            Event("locked", self.door, True, False))), 1)
+        self.door.set_status(False)
+        self.assertTrue(self.light.is_on())
+        self.ac.set_temperature(25)
+        self.assertEqual(self.engine.fired, 1)
+        self.ac.set_temperature(27)
+        self.assertTrue(self.door._locked)
+        self.assertEqual(self.engine.fired, 2)
+        self.assertEqual(Rule.from_dict(self.engine.get("šviesa").to_dict()).device,
+                         "Lauko durys")
+
+    # Testas, ar taisyklių ciklas nutraukiamas ir apie jį pranešama
+    def test_loop_is_detected(self):
+        self.engine.add(Rule("a", "brightness",
+                             lambda v, e: e.device.set_brightness(e.new % 100 + 1),
+                             device="Koridorius"))
+        self.light.set_brightness(10)
+        self.assertEqual(self.light.get_brightness(), 11)
+        self.assertEqual(self.engine.suppressed, 1)
+        self.assertEqual(self.sink.events[-1].kind, "rule_loop")
+
+    # Testas, ar per langą atėję pakeitimai sujungiami į vieną vykdymą
+    def test_debounce_coalesces_burst(self):
+        seen = []
+        self.engine.add(Rule("ryškumas", "brightness", lambda v, e: seen.append(e),
+                             device_type="Light", debounce=1.0))
+        for brightness in (60, 70, 80):
+            self.light.set_brightness(brightness)
+        self.assertEqual(self.engine.tick(), 0)
+        self.now = 1.0
+        self.assertEqual(self.engine.tick(), 1)
+        self.assertEqual([(e.old, e.new) for e in seen], [(50, 80)])
+        self.assertIsNone(self.engine.next_deadline())
+
+
+    # Testas, ar pliūpsnis, pasibaigęs sąlygai netinkama reikšme, nevykdomas
+    def test_debounce_uses_final_value(self):
+        self.engine.add(Rule("šviesa", "locked", {"device": "Koridorius", "set": {"status": True}},
+                             device="Lauko durys", condition={"equals": False},
+                             debounce=1.0))
+        self.door.set_status(False)
+        self.door.set_status(True)
+        self.now = 1.0
+        self.assertEqual(self.engine.tick(), 0)
+        self.assertFalse(self.light.is_on())
+        self.door.set_status(False)
+        self.now = 2.0
+        self.assertEqual(self.engine.tick(), 1)
+        self.assertTrue(self.light.is_on())
+
+class TestHistory(unittest.TestCase):
+    # Testas, ar pakeitimai įrašomi ir randami pagal laiko intervalą
+    def test_records_changes_and_range_query(self):
+        now = [0.0]
+        history = HistoryStore(segment_size=4, clock=lambda: now[0])
+        valdymas = Valdymas(DeviceFactory)
+        history.attach(valdymas)
+        light = valdymas.create_device("Light", "Virtuvė", brightness=10)
+        camera = valdymas.create_device("Camera", "Kiemas", resolution="720p")
+        for i, brightness in enumerate((20, 20, 30, 40, 50, 60), 1):
+            now[0] = float(i)
+            light.set_brightness(brightness)
+        light.turn_on()
+        camera.set_resolution("4K")
+        self.assertEqual(len(history.segments), 1)
+        self.assertEqual(history.query("Virtuvė", "brightness", 2, 4),
+                         [(3.0, 30.0), (4.0, 40.0)])
+        self.assertEqual(len(history.query("Virtuvė", "brightness")), 5)
+        self.assertEqual(history.query("Virtuvė", "status"), [(6.0, 1.0)])
+        self.assertEqual(history.attributes("Kiemas"), [])
+
+    # Testas, ar segmentai išlieka diske, seni sumažinami ir ištrinami
+    def test_segments_downsampling_and_retention(self):
+        with tempfile.TemporaryDirectory() as directory:
+            now = [0.0]
+            history = HistoryStore(directory, segment_size=100,
+                                   clock=lambda: now[0])
+            for i in range(250):
+                history.append("Salonas", "temperature", 18 + i % 10, timestamp=i * 10.0)
+            history.close()
+
+            history = HistoryStore(directory, segment_size=100, retention=1500,
+                                   downsample_after=500, resolution=100,
+                                   clock=lambda: now[0])
+            self.assertEqual(len(history), 250)
+            self.assertEqual(history.query("Salonas", "temperature", 0, 20),
+                             [(0.0, 18.0), (10.0, 19.0), (20.0, 20.0)])
+            history.compact(now=2800)
+            # Pirmas segmentas (0-990 s) ištrintas, antras sumažintas
+            points = history.query("Salonas", "temperature")
+            self.assertEqual(points[0], (1000.0, 27.0))
+            self.assertEqual(points[1], (1100.0, 27.0))
+            self.assertEqual(len(points), 10 + 50)
+            self.assertEqual(len(os.listdir(directory)), 3)
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.valdymas = Valdymas(DeviceFactory)
+        self.tvs = [self.valdymas.create_device("TV", f"TV {i}", channel=1, volume=5)
+                    for i in range(3)]
+        self.door = self.valdymas.create_device("Door", "Lauko durys", locked=False)
+        self.valdymas.turn_on_all()
+        self.clock = SimulatedClock(1000.0)
+
+    # Testas, ar tuo pačiu metu suveikiančios užduotys vykdomos vienu paketu
+    def test_same_instant_jobs_are_batched(self):
+        scheduler = Scheduler(self.valdymas, filename=None, clock=self.clock)
+        for tv in self.tvs:
+            scheduler.at(1100, {"device": tv.get_name(), "set": {"status": False}})
+        scheduler.at(1100, {"scene": "leavehome"})
+        scheduler.at(1100, {"scene": "leavehome"})
+        cancelled = scheduler.at(1200, {"bulk": {"TV": {"status": True}}})
+        self.assertTrue(scheduler.cancel(cancelled))
+        with patch.object(self.valdymas, "apply_scene",
+                          wraps=self.valdymas.apply_scene) as apply_scene:
+            scheduler.run_until(1050)
+            self.assertTrue(self.tvs[0].is_on())
+            scheduler.run_until(1300)
+        self.assertEqual(apply_scene.call_count, 1)
+        self.assertEqual(scheduler.batches, 1)
+        self.assertFalse(any(tv.is_on() for tv in self.tvs))
+        self.assertTrue(self.door._locked)
+        self.assertEqual(len(scheduler), 0)
+
+    # Testas, ar kartojama užduotis vykdoma kas intervalą ir išlieka faile
+    def test_recurring_jobs_and_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "schedule.json")
+            scheduler = Scheduler(self.valdymas, filename=filename, clock=self.clock)
+            job_id = scheduler.after(60, {"bulk": {"Door": {"locked": True}}}, every=3600)
+            nightly = scheduler.daily(23, 0, {"device": "TV 0", "set": {"status": False}})
+            scheduler.close()
+
+            fired = []
+            scheduler = Scheduler(self.valdymas, filename=filename, clock=self.clock)
+            scheduler.at(self.clock() + 30, lambda valdymas: fired.append(1))
+            scheduler.run_until(1000 + 60 + 2 * 3600)
+            self.assertEqual(fired, [1])
+            self.assertTrue(self.door._locked)
+            self.assertEqual(scheduler.get(job_id).when, 1060 + 3 * 3600)
+            self.assertEqual(scheduler.batches, 4)
+            self.assertEqual(datetime.fromtimestamp(scheduler.get(nightly).when).hour, 23)
+            with self.assertRaises(ValueError):
+                scheduler.at(0, {"skristi": True})
+
+
+    # Testas, ar daug užduočių neperrašo failo po kiekvieno paketo, o grupės
+    # pakeitimai netaikomi per visų tipo įrenginių perėjimą
+    def test_many_jobs_save_rarely(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "schedule.json")
+            scheduler = Scheduler(self.valdymas, filename=filename, clock=self.clock)
+            for i in range(2000):
+                scheduler.at(1001 + i, {"device": f"TV {i % 2}", "set": {"volume": i % 50}})
+            scheduler.at(5000, {"device": "TV 0", "set": {"status": False}})
+            scheduler.at(5000, {"device": "TV 1", "set": {"status": False}})
+            with patch.object(scheduler, "save", wraps=scheduler.save) as save, \
+                    patch.object(self.valdymas, "apply_changes") as apply_changes:
+                scheduler.run_until(6000)
+            self.assertLessEqual(save.call_count, 2)
+            apply_changes.assert_not_called()
+            self.assertFalse(self.tvs[0].is_on() or self.tvs[1].is_on())
+            scheduler.close()
+            with open(filename, encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["jobs"], [])
+
+    # Testas, ar nepavykusi užduotis nesustabdo kitų ir užduotys išsaugomos
+    def test_failing_job_does_not_stop_others(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "schedule.json")
+            sink = CollectingSink()
+            self.valdymas.sink = sink
+            scheduler = Scheduler(self.valdymas, filename=filename, clock=self.clock,
+                                  save_interval=0)
+            with self.assertRaises(ValueError):
+                scheduler.at(1100, {"scene": "typo"})
+            scheduler.at(1100, lambda valdymas: 1 / 0)
+            scheduler.at(1100, {"device": "TV 0", "set": {"skristi": True}})
+            scheduler.at(1100, {"device": "TV 1", "set": {"status": False}})
+            recurring = scheduler.at(1100, {"bulk": {"Door": {"locked": True}}}, every=100)
+            scheduler.run_until(1250)
+            self.assertEqual([job_id for job_id, _ in scheduler.errors], [1, 2])
+            self.assertEqual([event.kind for event in sink.events].count("job_failed"), 2)
+            self.assertFalse(self.tvs[1].is_on())
+            self.assertTrue(self.door._locked)
+            with open(filename, encoding="utf-8") as f:
+                saved = json.load(f)
+            self.assertEqual([job["id"] for job in saved["jobs"]], [recurring])
+            self.assertEqual(saved["jobs"][0]["when"], 1300)
+
+class TestStatusReport(unittest.TestCase):
+    def setUp(self):
+        self.valdymas = Valdymas(DeviceFactory)
+        self.tv = self.valdymas.create_device("TV", "Salonas", channel=1, volume=5)
+        self.lights = [self.valdymas.create_device("Light", f"Šviesa {i}", brightness=10)
+                       for i in range(4)]
+        self.report = self.valdymas.status_report()
+
+    # Testas, ar eilutė perskaičiuojama tik pasikeitusiam įrenginiui
+    def test_lines_are_cached_until_change(self):
+        first = self.report.render()
+        self.assertIs(self.report.render(), first)
+        with patch.object(Light, "device_info", autospec=True,
+                          side_effect=lambda device: device.get_name()) as info:
+            self.lights[1].set_brightness(80)
+            self.lights[2].set_brightness(10)
+            lines = self.report.lines()
+        self.assertEqual(info.call_count, 1)
+        self.assertEqual(lines[2], "Šviesa 1")
+        self.assertEqual(lines[0], self.tv.device_info())
+        with patch("sys.stdout", new_callable=StringIO) as stdout:
+            self.valdymas.print_device_info()
+        self.assertEqual(stdout.getvalue().count("\n"), 5)
+
+    # Testas, ar puslapiai ir pokyčiai nuo versijos grąžina tik reikiamas eilutes
+    def test_pages_and_delta(self):
+        page = self.report.page(2, size=2, format="jsonl")
+        self.assertEqual((page.pages, page.total), (3, 5))
+        self.assertEqual([json.loads(line)["name"] for line in page.lines],
+                         ["Šviesa 1", "Šviesa 2"])
+        version = page.version
+        self.tv.set_channel(7)
+        self.valdymas.delete_device(self.lights[0])
+        delta = self.report.delta(version)
+        self.assertEqual(delta.lines, [self.tv.device_info()])
+        self.assertEqual(delta.deleted, ["Šviesa 0"])
+        self.assertEqual(self.report.delta(delta.version), (delta.version, [], []))
+        self.valdymas.forget_changes(delta.version)
+        with self.assertRaises(ValueError):
+            self.report.delta(version)
+        self.assertEqual(len(self.report.lines()), 4)
+        with self.assertRaises(ValueError):
+            self.report.render("xml")
+
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        plugin = os.path.join(self.directory.name, "blinds.json")
+        with open(plugin, "w", encoding="utf-8") as f:
+            json.dump([{"type": "Blinds", "label": "Žaliuzės",
+                        "info": "{name} - Žaliuzės: {position}%",
+                        "fields": [{"name": "position", "label": "padėtis",
+                                    "type": "int", "min": 0,
+                                    "max": 100, "default": 0,
+                                    "prompt": "Įveskite padėtį: "}]}], f)
+        [self.Blinds] = DeviceFactory.load_plugin(plugin)
+
+    def tearDown(self):
+        del DeviceFactory._device_registry["Blinds"]
+        del SCHEMAS["Blinds"]
+        self.directory.cleanup()
+
+    # Testas, ar įskiepio tipas kuriamas, tikrinamas ir išsaugomas be papildomo kodo
+    def test_plugin_type_round_trip(self):
+        sink = CollectingSink()
+        valdymas = Valdymas(DeviceFactory, sink=sink)
+        blinds = valdymas.create_device("Blinds", "Langas", position=40)
+        self.assertEqual(blinds.device_info(), "Langas - Žaliuzės: 40%")
+        blinds.set_position(150)
+        self.assertEqual((blinds.get_position(), sink.events[-1].kind), (40, "invalid_value"))
+        blinds.set_param("position", 70)
+        blinds.turn_on()
+        self.assertEqual(valdymas.device_record(blinds),
+                         {"type": "Blinds", "name": "Langas", "status": True, "position": 70})
+        with self.assertRaises(ValueError):
+            valdymas.create_device("Blinds", "Kitas", position="daug")
+        self.assertEqual(self.Blinds("Trečias").get_position(), 0)
+
+        for format in ("json", "binary"):
+            filename = os.path.join(self.directory.name, f"devices.{format}")
+            valdymas.save_devices_to_file(filename, format=format)
+            restored = Valdymas(DeviceFactory)
+            restored.load_devices_from_file(filename, format=format)
+            device = restored.get_device("Langas")
+            self.assertIsInstance(device, self.Blinds)
+            self.assertEqual((device.get_position(), device.is_on()), (70, True))
+
+    # Testas, ar įtaisytųjų tipų setter'iai tikrina reikšmes pagal schemą
+    def test_builtin_setters_validate(self):
+        sink = CollectingSink()
+        valdymas = Valdymas(DeviceFactory, sink=sink)
+        light = valdymas.create_device("Light", "a", brightness=10)
+        valdymas.create_device("Light", "b", brightness=20)
+        light.set_brightness("abc")
+        self.assertEqual((light.get_brightness(), sink.events[-1].kind), (10, "invalid_value"))
+        light.set_param("brightness", 30)
+        self.assertEqual(list(valdymas.query(Between("brightness", 25))), [light])
+        tv = valdymas.create_device("TV", "tv", channel=1, volume=5)
+        tv.set_volume(None)
+        door = valdymas.create_device("Door", "d")
+        door.set_status("taip")
+        self.assertEqual((tv.get_volume(), door._locked), (5, False))
+
+    # Testas, ar schemos ribos tikrinamos kuriant ir įkeliant įrenginius
+    def test_builtin_schema_validation(self):
+        with self.assertRaises(ValueError):
+            DeviceFactory.create_device("AirConditioner", "Salonas", temperature=45)
+        with self.assertRaises(ValueError):
+            DeviceFactory.decode({"type": "TV", "name": "Salonas", "channel": 1})
+        door = DeviceFactory.decode({"type": "Door", "name": "Durys", "status": 1})
+        self.assertEqual((door._locked, door.is_on()), (False, True))
+
+    # Testas, ar įkeliant išsaugotos reikšmės netikrinamos, o sugadinti
+    # įrašai praleidžiami neįkeliant viso failo
+    def test_load_keeps_out_of_range_values(self):
+        filename = os.path.join(self.directory.name, "devices.json")
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump([{"type": "AirConditioner", "name": "Salonas", "status": True,
+                        "temperature": 100},
+                       {"type": "TV", "name": "Sugadintas", "status": False, "channel": 1},
+                       {"type": "Light", "name": "Šviesa", "status": False,
+                        "brightness": 5}], f)
+        sink = CollectingSink()
+        valdymas = Valdymas(DeviceFactory, sink=sink)
+        valdymas.load_devices_from_file(filename)
+        self.assertEqual(valdymas.get_device("Salonas").get_temperature(), 100)
+        self.assertEqual([device.get_name() for device in valdymas.devices],
+                         ["Salonas", "Šviesa"])
+        self.assertEqual([event.kind for event in sink.events], ["invalid_record"])
+        app = App(snapshot=filename,
+                  journal=os.path.join(self.directory.name, "devices.journal"),
+                  sink=CollectingSink())
+        self.assertEqual(len(app.start()), 2)
+        app.close()
+
+    # Testas, ar įskiepio laukai negali perrašyti Device atributų, o ne
+    # skaitiniai laukai neįtraukiami į reikšmių indeksus
+    def test_plugin_field_names(self):
+        for name in ("name", "status", "owner", "version"):
+            with self.assertRaises(ValueError):
+                DeviceSchema("Bad", [Field(name, "int")])
+        with self.assertRaises(ValueError):
+            DeviceSchema("Bad", [Field("power", "bool")]).bind(main.Device)
+        DeviceFactory.register_schema(DeviceSchema("Speaker", [Field("volume", "str")]))
+        self.addCleanup(SCHEMAS.pop, "Speaker")
+        self.addCleanup(DeviceFactory._device_registry.pop, "Speaker")
+        valdymas = Valdymas(DeviceFactory)
+        tv = valdymas.create_device("TV", "tv", channel=1, volume=5)
+        speaker = valdymas.create_device("Speaker", "Kolonėlė", volume="garsiai")
+        speaker.set_volume("tyliai")
+        self.assertEqual(speaker.get_volume(), "tyliai")
+        self.assertEqual(list(valdymas.query(Between("volume", 1))), [tv])
+        self.assertEqual(list(valdymas.query(TypeIs(speaker.__class__) & Between("volume", 1))), [])
+
+    # Testas, ar meniu klausimai imami iš schemos
+    def test_menu_uses_schema_prompts(self):
+        app = App(snapshot=os.path.join(self.directory.name, "devices.json"),
+                  journal=os.path.join(self.directory.name, "devices.journal"))
+        answers = iter(["4", "Žaliuzės", "Langas", "55", "4", "Blinds", "Blogas", "x",
+                        "4", "Durys", "Lauko", "taip", "9"])
+        prompts = []
+
+        def answer(prompt=""):
+            prompts.append(prompt)
+            return next(answers)
+
+        with patch("builtins.input", side_effect=answer), \
+                patch("sys.stdout", new_callable=StringIO) as stdout:
+            main.main(app)
+        self.assertEqual(app.valdymas.get_device("Langas").get_position(), 55)
+        self.assertIsNone(app.valdymas.get_device("Blogas"))
+        self.assertIn("invalid literal", stdout.getvalue())
+        self.assertTrue(app.valdymas.get_device("Lauko")._locked)
+        self.assertIn("Kondicionierius", prompts[1])
+        self.assertNotIn("AirConditioner", prompts[1])
+        self.assertIn("Ar durys užrakintos? (taip/ne): ", prompts)
+
+    # Testas, ar parametrų keitimo meniu (7) sudaromas iš schemų, įskaitant įskiepius
+    def test_menu_edits_schema_fields(self):
+        app = App(snapshot=os.path.join(self.directory.name, "devices.json"),
+                  journal=os.path.join(self.directory.name, "devices.journal"),
+                  sink=CollectingSink())
+        blinds = app.valdymas.create_device("Blinds", "Langas", position=10)
+        tv = app.valdymas.create_device("TV", "tv", channel=1, volume=5)
+        door = app.valdymas.create_device("Door", "Durys", locked=False)
+        labels = [schema.label for schema in main.menu_schemas(editable=True)]
+        prompts = []
+
+        def answer(prompt=""):
+            prompts.append(prompt)
+            return next(answers)
+
+        answers = iter(["7", str(labels.index("Žaliuzės") + 1), "1", "80",
+                        "7", str(labels.index("TV") + 1), "1", "garso lygis", "12",
+                        "7", str(labels.index("Durys") + 1), "1", "užrakinti",
+                        "7", str(labels.index("Kondicionierius") + 1),
+                        "7", str(labels.index("TV") + 1), "0", "9"])
+        with patch("builtins.input", side_effect=answer), \
+                patch("sys.stdout", new_callable=StringIO) as stdout:
+            main.main(app)
+        self.assertEqual((blinds.get_position(), tv.get_volume(), door._locked),
+                         (80, 12, True))
+        self.assertIn("Keisti (kanalas/garso lygis): ", prompts)
+        self.assertIn("Keisti (užrakinti/atrakinti): ", prompts)
+        self.assertIn("Nėra įrenginių: Kondicionierius.", stdout.getvalue())
+        self.assertIn("Netinkamas pasirinkimas.", stdout.getvalue())
+
+
+class TestApp(unittest.TestCase):
+    # Testas, ar "import main" neskaito failų ir nieko nespausdina
+    def test_import_has_no_side_effects(self):
+        with tempfile.TemporaryDirectory() as cwd:
+            env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+            output = subprocess.run([sys.executable, "-c", "import main"], cwd=cwd,
+                                    env=env, capture_output=True, text=True, check=True)
+            self.assertEqual(output.stdout, "")
+            self.assertEqual(os.listdir(cwd), [])
+
+    # Testas, ar įrenginiai įkeliami tik pirmą kartą pasiekus valdymas
+    def test_lazy_start(self):
+        with tempfile.TemporaryDirectory() as cwd:
+            snapshot = os.path.join(cwd, "devices.json")
+            Valdymas(DeviceFactory).save_devices_to_file(snapshot)
+            app = App(snapshot=snapshot, journal=os.path.join(cwd, "devices.journal"))
+            self.assertIsNone(app.journal)
+            app.valdymas.create_device("Light", "Šviesa", brightness=50)
+            app.close()
+
+            restored = App(snapshot=snapshot, journal=os.path.join(cwd, "devices.journal"))
+            self.assertEqual(restored.valdymas.get_device("Šviesa").get_brightness(), 50)
+            restored.close()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,34 @@
+import threading
+
+from main import Valdymas
+
+
+class ThreadSafeValdymas(Valdymas):
+    # Valdymas, kurį galima naudoti iš kelių gijų vienu metu:
+    # - bendri indeksai ir versijos saugomi vienu trumpai laikomu užraktu,
+    #   kuris tuo pačiu užtikrina, kad snapshot() matytų suderintą būseną;
+    # - kiekvienas įrenginys turi savo (dalijamą tarp stripes įrenginių)
+    #   užraktą, todėl vieno įrenginio pakeitimai ir pranešimai apie juos
+    #   eina ta pačia tvarka;
+    # - masinės operacijos ir išsaugojimas dirba su kopijomis.
+    # Užraktų tvarka: įrenginio -> bendras. Prenumeratoriai kviečiami
+    # laikant tik įrenginio užraktą
+    def __init__(self, device_factory, sink=None, stripes=64):
+        self._lock = threading.RLock()
+        self._stripes = [threading.RLock() for _ in range(stripes)]
+        super().__init__(device_factory, sink)
+
+    def device_lock(self, device):
+        # Keliems to paties įrenginio veiksmams atlikti atomiškai
+        return self._stripes[hash(device) % len(self._stripes)]
+
+    def _change(self, device, attr, value):
+        slot = "_" + attr
+        with self.device_lock(device):
+            with self._lock:
+                old = getattr(device, slot)
+                setattr(device, slot, value)
+                # Įrenginys galėjo būti ištrintas kitoje gijoje
+                if old != value and device._owner is self:
+                    self._update_indexes(device, attr, old, value)
+            self._publish(attr, device, old, value)